@@ -3,9 +3,12 @@ AI Service API v1 router configuration
 """
 
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 from app.api.v1.endpoints import recommendations, chat, classification
 
-api_router = APIRouter()
+# orjson serializes the list-of-dicts payloads much faster than the
+# default pure-Python JSON encoder
+api_router = APIRouter(default_response_class=ORJSONResponse)
 
 # Include all endpoint routers
 api_router.include_router(recommendations.router, prefix="/recommendations", tags=["recommendations"])
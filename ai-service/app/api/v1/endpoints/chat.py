@@ -2,52 +2,93 @@
 AI Chat assistant endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from secrets import token_urlsafe
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
-from app.core.database import get_db
-from app.services.chat_service import ChatService
+from pydantic import BaseModel, ConfigDict
+import orjson
+from app.core.database import get_async_db
+from app.services.chat_service import ChatService, STARTER_SUGGESTIONS
 
 router = APIRouter()
 
+# Pre-serialized body for the common unauthenticated suggestions poll
+_STARTER_SUGGESTIONS_BODY = orjson.dumps({"suggestions": list(STARTER_SUGGESTIONS)})
+
+
+def get_chat_service(db: AsyncSession = Depends(get_async_db)) -> ChatService:
+    """Dependency providing a request-scoped ChatService over shared clients"""
+    return ChatService(db)
+
 
 class ChatMessage(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     role: str  # user, assistant, system
     content: str
     timestamp: Optional[str] = None
 
 
+class ChatContext(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    page: Optional[str] = None
+    product_id: Optional[int] = None
+
+
+class RelatedProduct(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    id: int
+    title: str
+    price: float
+    image_url: Optional[str] = None
+
+
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     message: str
     user_id: Optional[int] = None
     session_id: Optional[str] = None
-    context: Optional[Dict[str, Any]] = None
+    context: Optional[ChatContext] = None
 
 
 class ChatResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     message: str
     suggestions: Optional[List[str]] = None
-    related_products: Optional[List[Dict[str, Any]]] = None
+    related_products: Optional[List[RelatedProduct]] = None
     session_id: str
 
 
 @router.post("/message", response_model=ChatResponse)
 async def send_chat_message(
     request: ChatRequest,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Send a message to the AI chat assistant"""
     try:
-        chat_service = ChatService(db)
-        
         response = await chat_service.process_message(
             message=request.message,
             user_id=request.user_id,
             session_id=request.session_id,
-            context=request.context
+            context=request.context.model_dump(exclude_none=True) if request.context else None
         )
-        
+
+        # Persist chat history after the response is sent
+        background_tasks.add_task(
+            chat_service.store_conversation,
+            response["session_id"],
+            request.user_id,
+            request.message,
+            response["message"]
+        )
+
         return response
         
     except Exception as e:
@@ -57,16 +98,50 @@ async def send_chat_message(
         )
 
 
+@router.post("/stream")
+async def stream_chat_message(
+    request: ChatRequest,
+    chat_service: ChatService = Depends(get_chat_service)
+):
+    """Stream the AI response back as Server-Sent Events"""
+    session_id = request.session_id or token_urlsafe(16)
+
+    async def event_stream():
+        chunks = []
+        async for delta in chat_service.stream_message(
+            message=request.message,
+            user_id=request.user_id,
+            session_id=session_id
+        ):
+            chunks.append(delta)
+            # JSON-encode the delta: a raw newline inside an SSE data line
+            # would terminate the event early and drop the remainder
+            yield f"data: {orjson.dumps(delta).decode()}\n\n"
+        yield "data: [DONE]\n\n"
+
+        # Persist chat history once the full response has been streamed
+        await chat_service.store_conversation(
+            session_id, request.user_id, request.message, "".join(chunks)
+        )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"X-Session-ID": session_id}
+    )
+
+
 @router.get("/suggestions")
 async def get_chat_suggestions(
     user_id: Optional[int] = None,
     session_id: Optional[str] = None,
-    db: Session = Depends(get_db)
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Get chat suggestions based on user context"""
     try:
-        chat_service = ChatService(db)
-        
+        if user_id is None and session_id is None:
+            return Response(content=_STARTER_SUGGESTIONS_BODY, media_type="application/json")
+
         suggestions = await chat_service.get_suggestions(
             user_id=user_id,
             session_id=session_id
@@ -86,12 +161,10 @@ async def get_chat_history(
     user_id: Optional[int] = None,
     session_id: Optional[str] = None,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """Get chat history for a user or session"""
     try:
-        chat_service = ChatService(db)
-        
         history = await chat_service.get_chat_history(
             user_id=user_id,
             session_id=session_id,
@@ -5,20 +5,29 @@ Product classification and auto-tagging endpoints
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from app.core.database import get_db
 from app.services.classification_service import ClassificationService
 
 router = APIRouter()
 
 
+def get_classification_service(db: Session = Depends(get_db)) -> ClassificationService:
+    """Dependency providing a request-scoped ClassificationService"""
+    return ClassificationService(db)
+
+
 class ClassificationRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     title: str
     description: Optional[str] = None
     images: Optional[List[str]] = None
 
 
 class ClassificationResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     category_id: int
     category_name: str
     confidence: float
@@ -27,12 +36,16 @@ class ClassificationResponse(BaseModel):
 
 
 class AutoTagRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     title: str
     description: Optional[str] = None
     category_id: Optional[int] = None
 
 
 class AutoTagResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     tags: List[str]
     confidence_scores: Dict[str, float]
 
@@ -40,12 +53,10 @@ class AutoTagResponse(BaseModel):
 @router.post("/product", response_model=ClassificationResponse)
 async def classify_product(
     request: ClassificationRequest,
-    db: Session = Depends(get_db)
+    classification_service: ClassificationService = Depends(get_classification_service)
 ):
     """Classify a product and suggest category, tags, and price range"""
     try:
-        classification_service = ClassificationService(db)
-        
         result = await classification_service.classify_product(
             title=request.title,
             description=request.description,
@@ -64,12 +75,10 @@ async def classify_product(
 @router.post("/auto-tag", response_model=AutoTagResponse)
 async def auto_tag_product(
     request: AutoTagRequest,
-    db: Session = Depends(get_db)
+    classification_service: ClassificationService = Depends(get_classification_service)
 ):
     """Generate automatic tags for a product"""
     try:
-        classification_service = ClassificationService(db)
-        
         result = await classification_service.generate_tags(
             title=request.title,
             description=request.description,
@@ -88,21 +97,16 @@ async def auto_tag_product(
 @router.post("/bulk-classify")
 async def bulk_classify_products(
     products: List[ClassificationRequest],
-    db: Session = Depends(get_db)
+    classification_service: ClassificationService = Depends(get_classification_service)
 ):
     """Bulk classify multiple products"""
     try:
-        classification_service = ClassificationService(db)
-        
-        results = []
-        for product in products:
-            result = await classification_service.classify_product(
-                title=product.title,
-                description=product.description,
-                images=product.images
-            )
-            results.append(result)
-        
+        # The service classifies the whole batch with one vectorized
+        # predict_proba pass instead of per-product pipeline runs
+        results = await classification_service.bulk_classify_products(
+            [product.model_dump() for product in products]
+        )
+
         return {"results": results}
         
     except Exception as e:
@@ -116,12 +120,10 @@ async def bulk_classify_products(
 async def get_category_suggestions(
     query: Optional[str] = None,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    classification_service: ClassificationService = Depends(get_classification_service)
 ):
     """Get category suggestions based on query"""
     try:
-        classification_service = ClassificationService(db)
-        
         suggestions = await classification_service.get_category_suggestions(
             query=query,
             limit=limit
@@ -2,10 +2,12 @@
 Product recommendation endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+import hashlib
+import orjson
 from app.core.database import get_db
 from app.core.config import settings
 from app.services.recommendation_service import RecommendationService
@@ -13,7 +15,24 @@ from app.services.recommendation_service import RecommendationService
 router = APIRouter()
 
 
+def get_recommendation_service(db: Session = Depends(get_db)) -> RecommendationService:
+    """Dependency providing a request-scoped RecommendationService"""
+    return RecommendationService(db)
+
+
+def _apply_cache_headers(recommendations, request: Request, response: Response):
+    """Set ETag/Cache-Control on globally shared results; 304 on ETag match"""
+    etag = hashlib.blake2b(orjson.dumps(recommendations)).hexdigest()[:16]
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "public, max-age=60, s-maxage=300"
+    return recommendations
+
+
 class RecommendationRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     user_id: Optional[int] = None
     product_id: Optional[int] = None
     category_id: Optional[int] = None
@@ -22,6 +41,8 @@ class RecommendationRequest(BaseModel):
 
 
 class RecommendationResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
     product_id: int
     title: str
     price: float
@@ -33,11 +54,10 @@ class RecommendationResponse(BaseModel):
 @router.post("/products", response_model=List[RecommendationResponse])
 async def get_product_recommendations(
     request: RecommendationRequest,
-    db: Session = Depends(get_db)
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """Get product recommendations"""
     try:
-        recommendation_service = RecommendationService(db)
         
         if request.user_id:
             # User-based recommendations
@@ -74,19 +94,21 @@ async def get_product_recommendations(
 
 @router.get("/trending", response_model=List[RecommendationResponse])
 async def get_trending_products(
+    request: Request,
+    response: Response,
     limit: int = 10,
     category_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """Get trending products"""
     try:
-        recommendation_service = RecommendationService(db)
         recommendations = await recommendation_service.get_trending_products(
             limit=limit,
             category_id=category_id
         )
-        
-        return recommendations
+
+        # Results are shared across users, so let proxies/browsers cache them
+        return _apply_cache_headers(recommendations, request, response)
         
     except Exception as e:
         raise HTTPException(
@@ -97,19 +119,21 @@ async def get_trending_products(
 
 @router.get("/new-arrivals", response_model=List[RecommendationResponse])
 async def get_new_arrivals(
+    request: Request,
+    response: Response,
     limit: int = 10,
     category_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """Get new arrival products"""
     try:
-        recommendation_service = RecommendationService(db)
         recommendations = await recommendation_service.get_new_arrivals(
             limit=limit,
             category_id=category_id
         )
-        
-        return recommendations
+
+        # Results are shared across users, so let proxies/browsers cache them
+        return _apply_cache_headers(recommendations, request, response)
         
     except Exception as e:
         raise HTTPException(
@@ -122,11 +146,10 @@ async def get_new_arrivals(
 async def get_personalized_recommendations(
     user_id: int,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    recommendation_service: RecommendationService = Depends(get_recommendation_service)
 ):
     """Get personalized recommendations for a user"""
     try:
-        recommendation_service = RecommendationService(db)
         recommendations = await recommendation_service.get_personalized_recommendations(
             user_id=user_id,
             limit=limit
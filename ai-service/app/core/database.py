@@ -3,6 +3,7 @@ Database configuration for AI service
 """
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -10,13 +11,27 @@ from app.core.config import settings
 # Create database engine
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE,
     echo=settings.DEBUG
 )
 
-# Create session factory
+# Async engine for services that run queries without blocking the event loop;
+# asyncmy decodes protocol frames in Cython rather than pure Python
+async_engine = create_async_engine(
+    settings.DATABASE_URL.replace("mysql+pymysql", "mysql+asyncmy"),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    echo=settings.DEBUG
+)
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=async_engine)
 
 # Create base class for models
 Base = declarative_base()
@@ -31,4 +46,10 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency to get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 
@@ -2,20 +2,204 @@
 AI Chat service for customer support
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, or_
 from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
 import openai
 import json
+import re
+import textwrap
+import time
 from datetime import datetime
-import uuid
+from secrets import token_urlsafe
+from cachetools import TTLCache
 
 from app.core.config import settings
+from app.models.product import Product, Category
+from app.models.order import Order
+
+# Shared OpenAI client; constructing one per request re-runs TLS/retry setup
+_OPENAI_CLIENT = openai.OpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
+
+# System prompt template, dedented once at import time; only the
+# marketplace context varies between refreshes
+_SYSTEM_PROMPT_TEMPLATE = textwrap.dedent("""\
+    You are a helpful AI assistant for an online marketplace. You can help customers with:
+    - Product information and recommendations
+    - Order status and tracking
+    - Return and refund policies
+    - General marketplace questions
+
+    Marketplace Information:
+    {marketplace_context}
+
+    Be helpful, friendly, and professional. If you don't know something, ask for clarification.""")
+
+# Marketplace stats only change on the scale of minutes, so cache the
+# fully assembled system prompt instead of hitting the database and
+# re-interpolating the template on every message
+_SYSTEM_PROMPT_TTL = 60.0
+_SYSTEM_PROMPT_CACHE = {"value": None, "expires": 0.0}
+_SYSTEM_PROMPT_LOCK = asyncio.Lock()
+
+# The popular-categories ranking joins products to categories; it changes
+# slowly, so refresh the materialized top-5 on a longer interval
+_POPULAR_CATEGORIES_TTL = 300.0
+_POPULAR_CATEGORIES_CACHE = {"value": None, "expires": 0.0}
+
+# Chat traffic is heavily repetitive (FAQ-style questions), so cache
+# responses keyed by the full messages array and skip the model call on hits
+_RESPONSE_CACHE = TTLCache(maxsize=5000, ttl=3600)
+_RESPONSE_CACHE_LOCKS: Dict[str, asyncio.Lock] = {}
+
+# Micro-batching window for OpenAI completion calls
+_COMPLETION_BATCH_WINDOW_MS = 10
+_COMPLETION_MAX_BATCH = 16
+
+
+def _response_cache_key(messages: List[Dict[str, str]]) -> str:
+    """Stable hash of the full messages array"""
+    return hashlib.blake2b(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+
+
+# Keyword -> topic table shared by fallback responses and suggestions;
+# one compiled alternation scan replaces the cascaded substring checks
+_KEYWORD_TOPICS = {
+    "order": "order",
+    "tracking": "order",
+    "status": "order",
+    "return": "return",
+    "refund": "return",
+    "exchange": "return",
+    "shipping": "shipping",
+    "delivery": "shipping",
+    "product": "product",
+    "item": "product",
+    "buy": "product",
+    "help": "help",
+    "support": "help",
+    "problem": "help",
+}
+_KEYWORD_PATTERN = re.compile("|".join(sorted(_KEYWORD_TOPICS, key=len, reverse=True)))
+
+_FALLBACK_RESPONSES = {
+    "order": "To check your order status, please visit the 'My Orders' section in your account or provide your order number.",
+    "return": "We offer a 30-day return policy. You can initiate a return from your order details page or contact our support team.",
+    "shipping": "We offer free shipping on orders over $50. Standard shipping takes 3-5 business days.",
+    "product": "I can help you find products! You can browse by category or use the search function. What are you looking for?",
+    "help": "I'm here to help! You can contact our support team at support@marketplace.com or use our help center.",
+}
+_DEFAULT_FALLBACK_RESPONSE = "I'm here to help with your marketplace questions. You can ask about products, orders, shipping, returns, or any other marketplace-related topics."
+
+# Fallback topics are checked in this order (most specific intent first)
+_FALLBACK_TOPIC_PRIORITY = ("order", "return", "shipping", "product", "help")
+
+_TOPIC_SUGGESTIONS = {
+    "order": ["Track my orders", "View order history", "Contact support"],
+    "product": ["Browse categories", "Search products", "View recommendations"],
+    "return": ["Return policy", "Start return process", "Contact support"],
+    "shipping": ["Shipping information", "Track package", "Delivery options"],
+}
+_DEFAULT_SUGGESTIONS = ["Browse products", "My account", "Contact support", "Help center"]
+
+# Starter suggestions shown by the chat UI; shared tuple so get_suggestions
+# does not allocate a fresh list of the same constants on every poll
+STARTER_SUGGESTIONS = (
+    "How do I track my order?",
+    "What's your return policy?",
+    "Do you offer free shipping?",
+    "How can I contact support?",
+    "What are your most popular products?",
+    "How do I create an account?",
+    "What payment methods do you accept?"
+)
+
+
+def _match_topics(message_lower: str) -> set:
+    """Classify a message into topics with a single linear keyword scan"""
+    return {_KEYWORD_TOPICS[kw] for kw in _KEYWORD_PATTERN.findall(message_lower)}
+
+
+# Product-keyword extraction for related-product lookups
+_PRODUCT_KEYWORD_PATTERN = re.compile(r"[a-z]{4,}")
+_MAX_PRODUCT_KEYWORDS = 8
+
+
+def _extract_product_keywords(message_lower: str) -> List[str]:
+    """Stream up to _MAX_PRODUCT_KEYWORDS unique words of 4+ letters"""
+    keywords = {}
+    for match in _PRODUCT_KEYWORD_PATTERN.finditer(message_lower):
+        keywords[match.group()] = None
+        if len(keywords) >= _MAX_PRODUCT_KEYWORDS:
+            break
+    return list(keywords)
+
+
+class _CompletionBatcher:
+    """Coalesces concurrent OpenAI completion calls into batched dispatches.
+
+    Requests arriving within the batch window are drained together and fired
+    as one asyncio.gather, amortizing connection setup and smoothing
+    rate-limit bursts under concurrent chat load.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._drain_task = None
+
+    async def submit(self, client, messages: List[Dict[str, str]]):
+        """Queue a completion call and wait for its result"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((client, messages, future))
+
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = asyncio.ensure_future(self._drain())
+
+        return await future
+
+    async def _drain(self):
+        # Loop until the queue is empty when a gather completes: requests
+        # that arrive mid-flight land in _pending while this task is still
+        # alive, so submit will not start another drain for them
+        while True:
+            await asyncio.sleep(_COMPLETION_BATCH_WINDOW_MS / 1000)
+
+            batch = self._pending[:_COMPLETION_MAX_BATCH]
+            self._pending = self._pending[_COMPLETION_MAX_BATCH:]
+
+            results = await asyncio.gather(
+                *(
+                    asyncio.to_thread(
+                        client.chat.completions.create,
+                        model="gpt-3.5-turbo",
+                        messages=messages,
+                        max_tokens=500,
+                        temperature=0.7
+                    )
+                    for client, messages, _ in batch
+                ),
+                return_exceptions=True
+            )
+
+            for (_, _, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            if not self._pending:
+                return
+
+
+_completion_batcher = _CompletionBatcher()
 
 
 class ChatService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, openai_client: Optional[openai.OpenAI] = None):
         self.db = db
-        self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
+        self.openai_client = openai_client if openai_client is not None else _OPENAI_CLIENT
     
     async def process_message(self, message: str, user_id: Optional[int] = None, 
                             session_id: Optional[str] = None, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -23,66 +207,40 @@ class ChatService:
         
         # Generate session ID if not provided
         if not session_id:
-            session_id = str(uuid.uuid4())
-        
-        # Get context about the marketplace
-        marketplace_context = await self._get_marketplace_context()
-        
-        # Prepare system prompt
-        system_prompt = f"""
-        You are a helpful AI assistant for an online marketplace. You can help customers with:
-        - Product information and recommendations
-        - Order status and tracking
-        - Return and refund policies
-        - General marketplace questions
-        
-        Marketplace Information:
-        {marketplace_context}
-        
-        Be helpful, friendly, and professional. If you don't know something, ask for clarification.
-        """
-        
-        # Get chat history
-        chat_history = await self.get_chat_history(user_id, session_id, limit=10)
+            session_id = token_urlsafe(16)
         
         # Prepare messages for OpenAI
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add chat history
-        for msg in chat_history:
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-        
-        # Add current message
-        messages.append({"role": "user", "content": message})
-        
+        messages = await self._prepare_messages(message, user_id, session_id)
+
         try:
-            if self.openai_client:
-                # Use OpenAI for response
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages,
-                    max_tokens=500,
-                    temperature=0.7
-                )
-                
-                ai_response = response.choices[0].message.content
-            else:
-                # Fallback response if OpenAI is not configured
-                ai_response = await self._get_fallback_response(message, context)
-            
-            # Generate suggestions
-            suggestions = await self._generate_suggestions(message, ai_response)
-            
-            # Get related products if relevant
-            related_products = await self._get_related_products(message)
-            
-            # Store chat history
-            await self._store_chat_message(session_id, user_id, "user", message)
-            await self._store_chat_message(session_id, user_id, "assistant", ai_response)
-            
+            cache_key = _response_cache_key(messages)
+            ai_response = _RESPONSE_CACHE.get(cache_key)
+
+            if ai_response is None:
+                # Per-key lock so concurrent identical misses only call once
+                lock = _RESPONSE_CACHE_LOCKS.setdefault(cache_key, asyncio.Lock())
+                async with lock:
+                    ai_response = _RESPONSE_CACHE.get(cache_key)
+                    if ai_response is None:
+                        if self.openai_client:
+                            # Use OpenAI for response (batched across concurrent sessions)
+                            response = await _completion_batcher.submit(self.openai_client, messages)
+                            ai_response = response.choices[0].message.content
+                        else:
+                            # Fallback response if OpenAI is not configured
+                            ai_response = await self._get_fallback_response(message, context)
+                        _RESPONSE_CACHE[cache_key] = ai_response
+                _RESPONSE_CACHE_LOCKS.pop(cache_key, None)
+
+            # Suggestions and related products are independent of each other,
+            # so dispatch them concurrently instead of summing their latencies
+            suggestions, related_products = await asyncio.gather(
+                self._generate_suggestions(message, ai_response),
+                self._get_related_products(message)
+            )
+
+            # Chat history is persisted by the caller (as a background task)
+            # so the response is not blocked on the writes
             return {
                 "message": ai_response,
                 "suggestions": suggestions,
@@ -101,24 +259,89 @@ class ChatService:
                 "session_id": session_id
             }
     
-    async def _get_marketplace_context(self) -> str:
-        """Get marketplace context information"""
-        from app.models.product import Product, Category
-        from app.models.order import Order
-        
-        # Get basic stats
-        total_products = self.db.query(Product).filter(Product.status == "active").count()
-        total_categories = self.db.query(Category).filter(Category.is_active == True).count()
-        total_orders = self.db.query(Order).count()
-        
+    async def _prepare_messages(self, message: str, user_id: Optional[int],
+                              session_id: Optional[str]) -> List[Dict[str, str]]:
+        """Assemble the OpenAI messages array for a chat message"""
+        # Get the system prompt (cached with the marketplace context baked in)
+        system_prompt = await self._get_system_prompt()
+
+        # Get chat history
+        chat_history = await self.get_chat_history(user_id, session_id, limit=10)
+
+        messages = [{"role": "system", "content": system_prompt}]
+
+        # Add chat history
+        for msg in chat_history:
+            messages.append({
+                "role": msg["role"],
+                "content": msg["content"]
+            })
+
+        # Add current message
+        messages.append({"role": "user", "content": message})
+
+        return messages
+
+    async def stream_message(self, message: str, user_id: Optional[int] = None,
+                           session_id: Optional[str] = None):
+        """Yield the AI response for a message chunk by chunk"""
+        messages = await self._prepare_messages(message, user_id, session_id)
+
+        if not self.openai_client:
+            # Fallback responses are computed in one piece
+            yield await self._get_fallback_response(message, None)
+            return
+
+        stream = await asyncio.to_thread(
+            self.openai_client.chat.completions.create,
+            model="gpt-3.5-turbo",
+            messages=messages,
+            max_tokens=500,
+            temperature=0.7,
+            stream=True
+        )
+
+        # The sync stream iterator blocks on the network, so step it in a
+        # worker thread to keep the event loop free
+        while True:
+            chunk = await asyncio.to_thread(next, stream, None)
+            if chunk is None:
+                break
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def _get_system_prompt(self) -> str:
+        """Get the assembled system prompt (cached with a short TTL)"""
+        if time.monotonic() < _SYSTEM_PROMPT_CACHE["expires"]:
+            return _SYSTEM_PROMPT_CACHE["value"]
+
+        async with _SYSTEM_PROMPT_LOCK:
+            # Re-check in case another request refreshed the cache while we waited
+            if time.monotonic() < _SYSTEM_PROMPT_CACHE["expires"]:
+                return _SYSTEM_PROMPT_CACHE["value"]
+
+            context = await self._build_marketplace_context()
+            prompt = _SYSTEM_PROMPT_TEMPLATE.format(marketplace_context=context)
+            _SYSTEM_PROMPT_CACHE["value"] = prompt
+            _SYSTEM_PROMPT_CACHE["expires"] = time.monotonic() + _SYSTEM_PROMPT_TTL
+            return prompt
+
+    async def _build_marketplace_context(self) -> str:
+        """Query marketplace stats and render the context string"""
+        # Get basic stats in a single roundtrip via scalar subqueries
+        stats = await self.db.execute(
+            select(
+                select(func.count()).select_from(Product).where(Product.status == "active").scalar_subquery(),
+                select(func.count()).select_from(Category).where(Category.is_active == True).scalar_subquery(),
+                select(func.count()).select_from(Order).scalar_subquery()
+            )
+        )
+        total_products, total_categories, total_orders = stats.one()
+
         # Get popular categories
-        popular_categories = self.db.query(Category.name).join(Product).filter(
-            Category.is_active == True,
-            Product.status == "active"
-        ).group_by(Category.id).limit(5).all()
-        
-        category_names = [cat.name for cat in popular_categories]
-        
+        category_names = await self._get_popular_categories()
+
         return f"""
         - Total Products: {total_products}
         - Categories: {total_categories}
@@ -129,102 +352,96 @@ class ChatService:
         - 24/7 customer support
         """
     
+    async def _get_popular_categories(self) -> List[str]:
+        """Get the top-5 categories by active product count (cached)"""
+        if time.monotonic() < _POPULAR_CATEGORIES_CACHE["expires"]:
+            return _POPULAR_CATEGORIES_CACHE["value"]
+
+        # The old query had no ORDER BY, so it returned an arbitrary 5 while
+        # still paying for the join; rank by product count instead
+        result = await self.db.execute(
+            select(Category.name).join(Product).where(
+                Category.is_active == True,
+                Product.status == "active"
+            ).group_by(Category.id).order_by(func.count(Product.id).desc()).limit(5)
+        )
+        names = [row.name for row in result]
+
+        _POPULAR_CATEGORIES_CACHE["value"] = names
+        _POPULAR_CATEGORIES_CACHE["expires"] = time.monotonic() + _POPULAR_CATEGORIES_TTL
+        return names
+
     async def _get_fallback_response(self, message: str, context: Optional[Dict[str, Any]]) -> str:
         """Get fallback response when OpenAI is not available"""
-        message_lower = message.lower()
-        
-        if any(word in message_lower for word in ["order", "tracking", "status"]):
-            return "To check your order status, please visit the 'My Orders' section in your account or provide your order number."
-        
-        elif any(word in message_lower for word in ["return", "refund", "exchange"]):
-            return "We offer a 30-day return policy. You can initiate a return from your order details page or contact our support team."
-        
-        elif any(word in message_lower for word in ["shipping", "delivery"]):
-            return "We offer free shipping on orders over $50. Standard shipping takes 3-5 business days."
-        
-        elif any(word in message_lower for word in ["product", "item", "buy"]):
-            return "I can help you find products! You can browse by category or use the search function. What are you looking for?"
-        
-        elif any(word in message_lower for word in ["help", "support", "problem"]):
-            return "I'm here to help! You can contact our support team at support@marketplace.com or use our help center."
-        
-        else:
-            return "I'm here to help with your marketplace questions. You can ask about products, orders, shipping, returns, or any other marketplace-related topics."
-    
+        topics = _match_topics(message.lower())
+
+        for topic in _FALLBACK_TOPIC_PRIORITY:
+            if topic in topics:
+                return _FALLBACK_RESPONSES[topic]
+
+        return _DEFAULT_FALLBACK_RESPONSE
+
     async def _generate_suggestions(self, user_message: str, ai_response: str) -> List[str]:
         """Generate helpful suggestions based on the conversation"""
+        topics = _match_topics(user_message.lower())
+
         suggestions = []
-        
-        if "order" in user_message.lower():
-            suggestions.extend(["Track my orders", "View order history", "Contact support"])
-        
-        if "product" in user_message.lower():
-            suggestions.extend(["Browse categories", "Search products", "View recommendations"])
-        
-        if "return" in user_message.lower() or "refund" in user_message.lower():
-            suggestions.extend(["Return policy", "Start return process", "Contact support"])
-        
-        if "shipping" in user_message.lower():
-            suggestions.extend(["Shipping information", "Track package", "Delivery options"])
-        
+        for topic in ("order", "product", "return", "shipping"):
+            if topic in topics:
+                suggestions.extend(_TOPIC_SUGGESTIONS[topic])
+
         # Default suggestions
         if not suggestions:
-            suggestions = ["Browse products", "My account", "Contact support", "Help center"]
-        
+            suggestions = _DEFAULT_SUGGESTIONS
+
         return suggestions[:4]  # Limit to 4 suggestions
     
     async def _get_related_products(self, message: str) -> List[Dict[str, Any]]:
         """Get related products based on the message"""
-        from app.models.product import Product
-        
-        # Simple keyword matching for now
-        message_lower = message.lower()
-        
-        # Extract potential product keywords
-        keywords = []
-        for word in message_lower.split():
-            if len(word) > 3:  # Skip short words
-                keywords.append(word)
-        
+        # Simple keyword matching for now; the extraction streams matches and
+        # stops early instead of tokenizing the whole message
+        keywords = _extract_product_keywords(message.lower())
+
         if not keywords:
             return []
-        
-        # Search for products with matching keywords
-        products = self.db.query(Product).filter(
-            Product.status == "active"
-        ).limit(3).all()
-        
+
+        # Match keywords against titles in SQL and fetch only the columns we
+        # return, instead of hydrating full ORM objects
+        result = await self.db.execute(
+            select(Product.id, Product.title, Product.price, Product.images).where(
+                Product.status == "active",
+                or_(*(Product.title.ilike(f"%{keyword}%") for keyword in keywords))
+            ).limit(3)
+        )
+        rows = result.all()
+
         return [
             {
-                "id": product.id,
-                "title": product.title,
-                "price": float(product.price),
-                "image_url": product.images[0] if product.images else None
+                "id": row.id,
+                "title": row.title,
+                "price": float(row.price),
+                "image_url": row.images[0] if row.images else None
             }
-            for product in products
+            for row in rows
         ]
     
-    async def _store_chat_message(self, session_id: str, user_id: Optional[int], 
+    async def store_conversation(self, session_id: str, user_id: Optional[int],
+                               message: str, ai_response: str):
+        """Persist a user/assistant message pair (run off the request path)"""
+        await self._store_chat_message(session_id, user_id, "user", message)
+        await self._store_chat_message(session_id, user_id, "assistant", ai_response)
+
+    async def _store_chat_message(self, session_id: str, user_id: Optional[int],
                                 role: str, content: str):
         """Store chat message in database"""
         # This would typically store in a chat_messages table
         # For now, we'll just log it
         print(f"Chat message stored: {session_id}, {user_id}, {role}, {content[:50]}...")
     
-    async def get_suggestions(self, user_id: Optional[int] = None, 
+    async def get_suggestions(self, user_id: Optional[int] = None,
                             session_id: Optional[str] = None) -> List[str]:
         """Get contextual suggestions"""
-        suggestions = [
-            "How do I track my order?",
-            "What's your return policy?",
-            "Do you offer free shipping?",
-            "How can I contact support?",
-            "What are your most popular products?",
-            "How do I create an account?",
-            "What payment methods do you accept?"
-        ]
-        
-        return suggestions
+        return list(STARTER_SUGGESTIONS)
     
     async def get_chat_history(self, user_id: Optional[int] = None, 
                              session_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
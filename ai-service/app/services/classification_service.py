@@ -3,48 +3,76 @@ Product classification and auto-tagging service
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, text
 from typing import List, Dict, Any, Optional
+import asyncio
 import re
+import string
+import time
 from collections import Counter
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
-import pickle
+import joblib
 import os
 
 from app.core.config import settings
 
+# Classification models are loaded once per process and shared across
+# requests; each service instance only carries the request-scoped session
+_MODEL_CACHE: Dict[str, Any] = {}
+
+# Keyword extraction runs on every classification request, so build the
+# stop-word set and punctuation table once at import time
+_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
+    'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had',
+    'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must',
+    'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they'
+})
+_PUNCT_TABLE = str.maketrans({c: ' ' for c in string.punctuation})
+
+# Category tag sets change slowly, so cache them per category instead of
+# querying on every classification; values are (tags, expires)
+_CATEGORY_TAGS_TTL = 300.0
+_CATEGORY_TAGS_CACHE: Dict[int, Any] = {}
+
 
 class ClassificationService:
     def __init__(self, db: Session):
         self.db = db
         self.vector_db_path = settings.VECTOR_DB_PATH
         self._load_classification_models()
-    
+
     def _load_classification_models(self):
-        """Load or create classification models"""
+        """Load or create classification models (cached per process)"""
+        if _MODEL_CACHE:
+            self.category_classifier = _MODEL_CACHE.get("category")
+            self.tag_classifier = _MODEL_CACHE.get("tag")
+            return
+
         os.makedirs(self.vector_db_path, exist_ok=True)
         
-        category_model_file = os.path.join(self.vector_db_path, "category_classifier.pkl")
-        tag_model_file = os.path.join(self.vector_db_path, "tag_classifier.pkl")
-        
+        category_model_file = os.path.join(self.vector_db_path, "category_classifier.joblib")
+        tag_model_file = os.path.join(self.vector_db_path, "tag_classifier.joblib")
+
         if os.path.exists(category_model_file):
-            with open(category_model_file, 'rb') as f:
-                self.category_classifier = pickle.load(f)
+            self.category_classifier = joblib.load(category_model_file)
         else:
             self.category_classifier = None
-        
+
         if os.path.exists(tag_model_file):
-            with open(tag_model_file, 'rb') as f:
-                self.tag_classifier = pickle.load(f)
+            self.tag_classifier = joblib.load(tag_model_file)
         else:
             self.tag_classifier = None
         
         # Build models if they don't exist
         if not self.category_classifier or not self.tag_classifier:
             self._build_classification_models()
+
+        _MODEL_CACHE["category"] = self.category_classifier
+        _MODEL_CACHE["tag"] = self.tag_classifier
     
     def _build_classification_models(self):
         """Build classification models from existing products"""
@@ -87,26 +115,25 @@ class ClassificationService:
         
         # Train tag classifier (simplified approach)
         if texts and tags_list:
-            # Flatten all tags
-            all_tags = []
+            # Count tags without materializing one concatenated list
+            tag_counter = Counter()
             for tags in tags_list:
-                all_tags.extend(tags)
-            
+                tag_counter.update(tags)
+
             # Get most common tags
-            tag_counter = Counter(all_tags)
             common_tags = [tag for tag, count in tag_counter.most_common(50)]
-            
-            # Create binary features for each tag
-            tag_features = []
-            for text in texts:
-                features = []
-                for tag in common_tags:
-                    features.append(1 if tag.lower() in text.lower() else 0)
-                tag_features.append(features)
-            
+
+            # Build binary tag features in one vectorized pass instead of a
+            # Python double loop over texts x tags; stays sparse (CSR)
+            tag_vectorizer = CountVectorizer(
+                vocabulary={tag.lower(): i for i, tag in enumerate(common_tags)},
+                binary=True
+            )
+
             self.tag_classifier = {
                 'tags': common_tags,
-                'features': np.array(tag_features)
+                'vectorizer': tag_vectorizer,
+                'features': tag_vectorizer.transform(texts)
             }
         
         # Save models
@@ -114,16 +141,16 @@ class ClassificationService:
     
     def _save_classification_models(self):
         """Save classification models to disk"""
-        category_model_file = os.path.join(self.vector_db_path, "category_classifier.pkl")
-        tag_model_file = os.path.join(self.vector_db_path, "tag_classifier.pkl")
-        
+        category_model_file = os.path.join(self.vector_db_path, "category_classifier.joblib")
+        tag_model_file = os.path.join(self.vector_db_path, "tag_classifier.joblib")
+
+        # joblib serializes the numpy arrays inside the pipeline natively and
+        # compresses the archive, unlike a plain pickle
         if self.category_classifier:
-            with open(category_model_file, 'wb') as f:
-                pickle.dump(self.category_classifier, f)
-        
+            joblib.dump(self.category_classifier, category_model_file, compress=3)
+
         if self.tag_classifier:
-            with open(tag_model_file, 'wb') as f:
-                pickle.dump(self.tag_classifier, f)
+            joblib.dump(self.tag_classifier, tag_model_file, compress=3)
     
     async def classify_product(self, title: str, description: Optional[str] = None, 
                              images: Optional[List[str]] = None) -> Dict[str, Any]:
@@ -141,8 +168,12 @@ class ClassificationService:
         
         if self.category_classifier:
             try:
-                predicted_category_id = self.category_classifier.predict([text])[0]
-                confidence = self.category_classifier.predict_proba([text]).max()
+                # One predict_proba pass gives both the class and the
+                # confidence; calling predict() too would run the TF-IDF
+                # pipeline a second time
+                proba = self.category_classifier.predict_proba([text])[0]
+                predicted_category_id = self.category_classifier.classes_[proba.argmax()]
+                confidence = proba.max()
             except:
                 pass
         
@@ -183,58 +214,34 @@ class ClassificationService:
         if category_id:
             category_tags = await self._get_category_tags(category_id)
         
-        # Combine and score tags
-        all_tags = keywords + category_tags
-        tag_scores = {}
-        
-        for tag in all_tags:
-            if tag in tag_scores:
-                tag_scores[tag] += 1
-            else:
-                tag_scores[tag] = 1
-        
-        # Sort by score and return top tags
-        sorted_tags = sorted(tag_scores.items(), key=lambda x: x[1], reverse=True)
-        top_tags = [tag for tag, score in sorted_tags[:10]]
-        
+        # Combine and score tags; Counter counts and selects the top entries
+        # in C instead of a manual dict loop plus a full sort
+        top_tags = Counter(keywords + category_tags).most_common(10)
+
         return {
-            "tags": top_tags,
-            "confidence_scores": dict(sorted_tags[:10])
+            "tags": [tag for tag, score in top_tags],
+            "confidence_scores": dict(top_tags)
         }
     
     def _extract_keywords(self, text: str) -> List[str]:
         """Extract keywords from text"""
-        # Convert to lowercase and remove special characters
-        text = re.sub(r'[^\w\s]', ' ', text.lower())
-        
-        # Split into words
-        words = text.split()
-        
-        # Filter out common stop words
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with',
-            'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had',
-            'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must',
-            'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they'
-        }
-        
-        # Filter words
-        keywords = [word for word in words if len(word) > 2 and word not in stop_words]
-        
+        # Lowercase and strip punctuation via a C-level translate table
+        words = text.lower().translate(_PUNCT_TABLE).split()
+
+        # Filter short words and stop words
+        keywords = [word for word in words if len(word) > 2 and word not in _STOP_WORDS]
+
         # Remove duplicates while preserving order
-        seen = set()
-        unique_keywords = []
-        for keyword in keywords:
-            if keyword not in seen:
-                unique_keywords.append(keyword)
-                seen.add(keyword)
-        
-        return unique_keywords
+        return list(dict.fromkeys(keywords))
     
     async def _get_category_tags(self, category_id: int) -> List[str]:
-        """Get common tags for a category"""
+        """Get common tags for a category (cached with a short TTL)"""
         from app.models.product import Product
-        
+
+        cached = _CATEGORY_TAGS_CACHE.get(category_id)
+        if cached and time.monotonic() < cached[1]:
+            return cached[0]
+
         # Get products in this category
         products = self.db.query(Product).filter(
             Product.category_id == category_id,
@@ -249,7 +256,10 @@ class ClassificationService:
         
         # Get most common tags
         tag_counter = Counter(all_tags)
-        return [tag for tag, count in tag_counter.most_common(10)]
+        tags = [tag for tag, count in tag_counter.most_common(10)]
+
+        _CATEGORY_TAGS_CACHE[category_id] = (tags, time.monotonic() + _CATEGORY_TAGS_TTL)
+        return tags
     
     async def _suggest_price_range(self, title: str, description: Optional[str] = None, 
                                  category_id: Optional[int] = None) -> Optional[Dict[str, float]]:
@@ -258,23 +268,25 @@ class ClassificationService:
         
         if not category_id:
             return None
-        
-        # Get products in the same category
-        products = self.db.query(Product.price).filter(
+
+        # Let the database compute the aggregates instead of pulling every
+        # price into Python
+        min_price, max_price, avg_price = self.db.query(
+            func.min(Product.price),
+            func.max(Product.price),
+            func.avg(Product.price)
+        ).filter(
             Product.category_id == category_id,
             Product.status == "active",
             Product.price.isnot(None)
-        ).all()
-        
-        if not products:
+        ).one()
+
+        if avg_price is None:
             return None
-        
-        prices = [float(product.price) for product in products]
-        
-        # Calculate price statistics
-        min_price = min(prices)
-        max_price = max(prices)
-        avg_price = sum(prices) / len(prices)
+
+        min_price = float(min_price)
+        max_price = float(max_price)
+        avg_price = float(avg_price)
         
         # Suggest range around average
         suggested_min = max(min_price, avg_price * 0.7)
@@ -288,42 +300,99 @@ class ClassificationService:
     
     async def bulk_classify_products(self, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Bulk classify multiple products"""
-        results = []
-        
+        from app.models.product import Category
+
+        if not products:
+            return []
+
+        texts = []
         for product in products:
-            result = await self.classify_product(
-                title=product["title"],
-                description=product.get("description"),
-                images=product.get("images")
-            )
-            results.append(result)
-        
-        return results
+            text = product["title"]
+            if product.get("description"):
+                text += f" {product['description']}"
+            texts.append(text)
+
+        # One batched predict_proba over the whole batch instead of running
+        # the TF-IDF pipeline once per product
+        predicted_ids = [None] * len(texts)
+        confidences = [0.0] * len(texts)
+
+        if self.category_classifier:
+            try:
+                probas = self.category_classifier.predict_proba(texts)
+                classes = self.category_classifier.classes_
+                predicted_ids = [int(classes[row.argmax()]) for row in probas]
+                confidences = [float(row.max()) for row in probas]
+            except:
+                pass
+
+        # Resolve all predicted category names in one query
+        category_names = {}
+        unique_ids = {pid for pid in predicted_ids if pid}
+        if unique_ids:
+            for category in self.db.query(Category).filter(Category.id.in_(unique_ids)).all():
+                category_names[category.id] = category.name
+
+        # Tags and price ranges per product; category tags and aggregates are
+        # cached/pushed to SQL, so dispatch them concurrently
+        tag_results = await asyncio.gather(*(
+            self.generate_tags(product["title"], product.get("description"), predicted_id)
+            for product, predicted_id in zip(products, predicted_ids)
+        ))
+        price_ranges = await asyncio.gather(*(
+            self._suggest_price_range(product["title"], product.get("description"), predicted_id)
+            for product, predicted_id in zip(products, predicted_ids)
+        ))
+
+        return [
+            {
+                "category_id": predicted_id or 1,  # Default to first category
+                "category_name": category_names.get(predicted_id, "Unknown"),
+                "confidence": confidence,
+                "suggested_tags": tags["tags"],
+                "suggested_price_range": price_range
+            }
+            for predicted_id, confidence, tags, price_range
+            in zip(predicted_ids, confidences, tag_results, price_ranges)
+        ]
     
     async def get_category_suggestions(self, query: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
         """Get category suggestions based on query"""
-        from app.models.product import Category
-        
+        from app.models.product import Category, Product
+        from sqlalchemy import and_
+
+        # One outer-joined aggregate returns real product counts without a
+        # follow-up query per category
+        suggestions_query = self.db.query(
+            Category, func.count(Product.id)
+        ).outerjoin(
+            Product, and_(Product.category_id == Category.id, Product.status == "active")
+        ).filter(
+            Category.is_active == True
+        ).group_by(Category.id)
+
         if query:
-            # Search categories by name
-            categories = self.db.query(Category).filter(
-                Category.name.contains(query),
-                Category.is_active == True
-            ).limit(limit).all()
-        else:
-            # Get popular categories
-            categories = self.db.query(Category).filter(
-                Category.is_active == True
-            ).limit(limit).all()
-        
+            # Search categories by name. MATCH ... AGAINST is served by the
+            # FULLTEXT index on name, which a LIKE '%...%' scan cannot use;
+            # boolean mode with a trailing * matches any word prefix in
+            # multi-word names. Terms are reduced to word characters first
+            # so user input cannot inject boolean-mode operators.
+            terms = re.findall(r"\w+", query)
+            if terms:
+                suggestions_query = suggestions_query.filter(
+                    text("MATCH(categories.name) AGAINST(:match_query IN BOOLEAN MODE)")
+                ).params(match_query=" ".join(f"+{term}*" for term in terms))
+
+        rows = suggestions_query.limit(limit).all()
+
         return [
             {
                 "id": category.id,
                 "name": category.name,
                 "description": category.description,
-                "product_count": 0  # Would need to count products
+                "product_count": product_count
             }
-            for category in categories
+            for category, product_count in rows
         ]
 
 
@@ -5,42 +5,102 @@ Product recommendation service
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_
 from typing import List, Dict, Any, Optional
+import hashlib
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sentence_transformers import SentenceTransformer
 import faiss
-import pickle
+import torch
 import os
 from datetime import datetime, timedelta
 
 from app.core.config import settings
 
+# The embedding model and vector store take seconds to construct, so they
+# are loaded once per process and shared by every request-scoped service
+_EMBEDDING_MODEL = None
+_VECTOR_STORE: Dict[str, Any] = {}
+
+
+def _get_embedding_model() -> SentenceTransformer:
+    """Load the shared sentence-transformer model (once per process)"""
+    global _EMBEDDING_MODEL
+    if _EMBEDDING_MODEL is None:
+        model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        if torch.cuda.is_available():
+            # fp16 doubles encode throughput on tensor cores
+            model = model.to("cuda").half()
+        _EMBEDDING_MODEL = model
+    return _EMBEDDING_MODEL
+
 
 class RecommendationService:
     def __init__(self, db: Session):
         self.db = db
-        self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+        self.embedding_model = _get_embedding_model()
         self.vector_db_path = settings.VECTOR_DB_PATH
         self._load_or_create_vector_db()
-    
+
     def _load_or_create_vector_db(self):
-        """Load or create vector database for product embeddings"""
+        """Load or create vector database for product embeddings (shared per process)"""
+        if _VECTOR_STORE:
+            self.index = _VECTOR_STORE["index"]
+            self._faiss_ids = _VECTOR_STORE["ids"]
+            self._embeddings = _VECTOR_STORE["embeddings"]
+            self._id_to_row = _VECTOR_STORE["id_to_row"]
+            return
+
         os.makedirs(self.vector_db_path, exist_ok=True)
-        
-        vector_file = os.path.join(self.vector_db_path, "product_embeddings.pkl")
+
+        ids_file = os.path.join(self.vector_db_path, "product_ids.npy")
+        embeddings_file = os.path.join(self.vector_db_path, "product_embeddings.npy")
         index_file = os.path.join(self.vector_db_path, "product_index.faiss")
-        
-        if os.path.exists(vector_file) and os.path.exists(index_file):
-            # Load existing vector database
-            with open(vector_file, 'rb') as f:
-                self.product_embeddings = pickle.load(f)
-            
+
+        if os.path.exists(ids_file) and os.path.exists(embeddings_file) and os.path.exists(index_file):
+            # Load existing vector database; the embedding matrix is mmapped
+            # so the OS pages rows in on demand instead of unpickling it all
+            self._set_embeddings(
+                np.load(ids_file),
+                np.load(embeddings_file, mmap_mode='r')
+            )
             self.index = faiss.read_index(index_file)
         else:
             # Create new vector database
             self._build_vector_db()
-    
+
+        # Publish for reuse by subsequent requests in this process
+        _VECTOR_STORE.update({
+            "index": self.index,
+            "ids": self._faiss_ids,
+            "embeddings": self._embeddings,
+            "id_to_row": self._id_to_row
+        })
+
+    def _set_embeddings(self, ids, embeddings):
+        """Store the id array, embedding matrix, and id->row lookup"""
+        self._faiss_ids = np.asarray(ids, dtype=np.int64)
+        self._embeddings = embeddings
+        self._id_to_row = {int(pid): row for row, pid in enumerate(self._faiss_ids)}
+
+    def _load_embedding_cache(self) -> Dict[Any, np.ndarray]:
+        """Load the previous build's embeddings keyed by (product_id, text hash)"""
+        ids_file = os.path.join(self.vector_db_path, "product_ids.npy")
+        embeddings_file = os.path.join(self.vector_db_path, "product_embeddings.npy")
+        hashes_file = os.path.join(self.vector_db_path, "product_hashes.npy")
+
+        if not (os.path.exists(ids_file) and os.path.exists(embeddings_file) and os.path.exists(hashes_file)):
+            return {}
+
+        old_ids = np.load(ids_file)
+        old_embeddings = np.load(embeddings_file, mmap_mode='r')
+        old_hashes = np.load(hashes_file)
+
+        return {
+            (int(pid), bytes(digest)): old_embeddings[row]
+            for row, (pid, digest) in enumerate(zip(old_ids, old_hashes))
+        }
+
     def _build_vector_db(self):
         """Build vector database from products"""
         # Get all active products
@@ -51,14 +111,16 @@ class RecommendationService:
         ).all()
         
         if not products:
-            self.product_embeddings = {}
+            self._set_embeddings(np.empty(0, dtype=np.int64), None)
+            self._hashes = None
             self.index = None
             return
-        
+
         # Create embeddings for products
         product_texts = []
         product_ids = []
-        
+        product_hashes = []
+
         for product in products:
             # Combine title, description, and tags for embedding
             text = f"{product.title}"
@@ -66,35 +128,77 @@ class RecommendationService:
                 text += f" {product.description}"
             if product.tags:
                 text += f" {' '.join(product.tags)}"
-            
+
             product_texts.append(text)
             product_ids.append(product.id)
+            product_hashes.append(
+                hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+            )
+
+        # Reuse embeddings from the previous build for products whose text is
+        # unchanged; transformer inference dominates rebuild time, so an
+        # incremental rebuild only pays for the delta
+        cached_rows = self._load_embedding_cache()
+        row_embeddings: List[Any] = [None] * len(product_ids)
+        to_encode_texts = []
+        to_encode_positions = []
+
+        for position, (product_id, digest) in enumerate(zip(product_ids, product_hashes)):
+            cached = cached_rows.get((product_id, digest))
+            if cached is not None:
+                row_embeddings[position] = cached
+            else:
+                to_encode_texts.append(product_texts[position])
+                to_encode_positions.append(position)
+
+        if to_encode_texts:
+            # Generate embeddings in large batches; the encoder normalizes
+            # them, so no separate normalize_L2 pass is needed
+            new_embeddings = self.embedding_model.encode(
+                to_encode_texts,
+                batch_size=256,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            for position, embedding in zip(to_encode_positions, new_embeddings):
+                row_embeddings[position] = embedding
+
+        embeddings = np.stack(row_embeddings).astype(np.float32)
+        self._hashes = np.asarray(product_hashes, dtype='S16')
         
-        # Generate embeddings
-        embeddings = self.embedding_model.encode(product_texts)
-        
-        # Create FAISS index
+        # Create FAISS index; HNSW searches a graph of candidates instead of
+        # brute-force scanning every vector, and the 8-bit scalar quantizer
+        # stores codes at a quarter of the fp32 footprint
         dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
-        
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
+        self.index = faiss.IndexHNSWSQ(
+            dimension, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT
+        )
+        self.index.hnsw.efConstruction = 200
+        self.index.hnsw.efSearch = 64
+
+        self.index.train(embeddings)
         self.index.add(embeddings)
-        
-        # Store product embeddings mapping
-        self.product_embeddings = {pid: emb for pid, emb in zip(product_ids, embeddings)}
-        
+
+        # Store product ids and embeddings as arrays aligned with FAISS rows
+        self._set_embeddings(product_ids, embeddings)
+
         # Save to disk
         self._save_vector_db()
-    
+
     def _save_vector_db(self):
         """Save vector database to disk"""
-        vector_file = os.path.join(self.vector_db_path, "product_embeddings.pkl")
+        ids_file = os.path.join(self.vector_db_path, "product_ids.npy")
+        embeddings_file = os.path.join(self.vector_db_path, "product_embeddings.npy")
+        hashes_file = os.path.join(self.vector_db_path, "product_hashes.npy")
         index_file = os.path.join(self.vector_db_path, "product_index.faiss")
-        
-        with open(vector_file, 'wb') as f:
-            pickle.dump(self.product_embeddings, f)
-        
+
+        if self._embeddings is not None:
+            np.save(ids_file, self._faiss_ids)
+            np.save(embeddings_file, self._embeddings)
+            if self._hashes is not None:
+                np.save(hashes_file, self._hashes)
+
         if self.index:
             faiss.write_index(self.index, index_file)
     
@@ -103,75 +207,126 @@ class RecommendationService:
         from app.models.order import Order, OrderItem
         from app.models.product import Product
         
-        # Get user's purchase history
+        # Get user's purchase history, capped to the most recent purchases so
+        # the FAISS query batch stays bounded for heavy buyers
         purchased_products = self.db.query(Product.id).join(OrderItem).join(Order).filter(
             Order.buyer_id == user_id,
             Order.status.in_(["paid", "processing", "shipped", "delivered"])
-        ).all()
+        ).order_by(desc(Order.created_at)).limit(32).all()
         
         if not purchased_products:
             # If no purchase history, return popular products
             return await self.get_popular_products(limit)
-        
-        # Get similar products based on purchase history
+
+        # Search similar products for the whole purchase history in one
+        # batched FAISS call instead of one search per product
         purchased_ids = [p.id for p in purchased_products]
-        similar_products = []
-        
-        for product_id in purchased_ids:
-            if product_id in self.product_embeddings:
-                similar = await self.get_similar_products(product_id, limit=5)
-                similar_products.extend(similar)
-        
-        # Remove duplicates and already purchased products
+        query_rows = [
+            self._id_to_row[pid] for pid in purchased_ids
+            if pid in self._id_to_row
+        ]
+
+        if not query_rows or not self.index:
+            return await self.get_popular_products(limit)
+
+        scores, indices = self.index.search(self._embeddings[query_rows], 6)
+
+        # Rank all candidates globally by score, then deduplicate and drop
+        # already purchased products
+        flat_scores = scores.ravel()
+        flat_indices = indices.ravel()
         seen = set(purchased_ids)
-        unique_recommendations = []
-        
-        for rec in similar_products:
-            if rec['product_id'] not in seen:
-                unique_recommendations.append(rec)
-                seen.add(rec['product_id'])
-        
-        return unique_recommendations[:limit]
+        candidate_ids = []
+        candidate_scores = {}
+
+        for pos in np.argsort(-flat_scores):
+            idx = flat_indices[pos]
+            if idx == -1 or idx >= len(self._faiss_ids):
+                continue
+            candidate_id = int(self._faiss_ids[idx])
+            if candidate_id in seen:
+                continue
+            seen.add(candidate_id)
+            candidate_ids.append(candidate_id)
+            candidate_scores[candidate_id] = float(flat_scores[pos])
+            if len(candidate_ids) >= limit:
+                break
+
+        if not candidate_ids:
+            return []
+
+        # Fetch details for all candidates in a single query
+        products = {
+            product.id: product
+            for product in self.db.query(Product).filter(Product.id.in_(candidate_ids)).all()
+        }
+
+        recommendations = []
+        for product_id in candidate_ids:
+            product = products.get(product_id)
+            if product:
+                recommendations.append({
+                    "product_id": product.id,
+                    "title": product.title,
+                    "price": float(product.price),
+                    "image_url": product.images[0] if product.images else None,
+                    "score": candidate_scores[product.id],
+                    "reason": "Similar product"
+                })
+
+        return recommendations
     
     async def get_similar_products(self, product_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         """Get products similar to the given product"""
         from app.models.product import Product
         
-        if product_id not in self.product_embeddings or not self.index:
+        if product_id not in self._id_to_row or not self.index:
             return []
-        
+
         # Get product embedding
-        product_embedding = self.product_embeddings[product_id].reshape(1, -1)
-        
+        product_embedding = self._embeddings[self._id_to_row[product_id]].reshape(1, -1)
+
         # Search for similar products
         scores, indices = self.index.search(product_embedding, limit + 1)  # +1 to exclude self
-        
-        # Get product details
-        similar_products = []
+
+        # Map FAISS rows back to candidate ids, keeping FAISS score order
+        candidate_ids = []
+        candidate_scores = {}
         for score, idx in zip(scores[0], indices[0]):
-            if idx == -1:  # Invalid index
+            if idx == -1 or idx >= len(self._faiss_ids):  # Invalid index
                 continue
-            
-            # Find product ID by index
-            product_ids = list(self.product_embeddings.keys())
-            if idx < len(product_ids):
-                similar_product_id = product_ids[idx]
-                
-                # Skip the same product
-                if similar_product_id == product_id:
-                    continue
-                
-                product = self.db.query(Product).filter(Product.id == similar_product_id).first()
-                if product:
-                    similar_products.append({
-                        "product_id": product.id,
-                        "title": product.title,
-                        "price": float(product.price),
-                        "image_url": product.images[0] if product.images else None,
-                        "score": float(score),
-                        "reason": "Similar product"
-                    })
-        
+
+            similar_product_id = int(self._faiss_ids[idx])
+
+            # Skip the same product
+            if similar_product_id == product_id:
+                continue
+
+            candidate_ids.append(similar_product_id)
+            candidate_scores[similar_product_id] = float(score)
+
+        if not candidate_ids:
+            return []
+
+        # One bulk fetch instead of a query per candidate
+        products = {
+            product.id: product
+            for product in self.db.query(Product).filter(Product.id.in_(candidate_ids)).all()
+        }
+
+        similar_products = []
+        for similar_product_id in candidate_ids:
+            product = products.get(similar_product_id)
+            if product:
+                similar_products.append({
+                    "product_id": product.id,
+                    "title": product.title,
+                    "price": float(product.price),
+                    "image_url": product.images[0] if product.images else None,
+                    "score": candidate_scores[similar_product_id],
+                    "reason": "Similar product"
+                })
+
         return similar_products[:limit]
     
     async def get_category_recommendations(self, category_id: int, limit: int = 10) -> List[Dict[str, Any]]:
@@ -58,11 +58,15 @@ async def health_check():
 
 
 if __name__ == "__main__":
+    # reload forks a file watcher and pins the app to one worker; only use
+    # it in debug. In production, scale workers to the available cores
+    # (or run gunicorn -k uvicorn.workers.UvicornWorker -w N main:app).
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8001,
-        reload=True
+        reload=settings.DEBUG,
+        workers=1 if settings.DEBUG else max(2, os.cpu_count() or 2)
     )
 
 
@@ -3,19 +3,24 @@ Admin panel endpoints
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, raiseload
+from sqlalchemy import select, update, func, case, and_
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
-from app.core.database import get_db
+import asyncio
+from app.core.cache import get_cached_json, set_cached_json
+from app.core.database import get_async_db, execute_detached
 from app.core.security import require_admin
 from app.models.user import User, UserRole, Seller
 from app.models.product import Product, Category
-from app.models.order import Order, OrderItem, Payment, SellerPayout
+from app.models.order import Order, OrderItem, Payment, SellerPayout, PAID_ORDER_STATUSES
 from app.models.message import Message, Notification, AnalyticsEvent
 from app.schemas.user import UserResponse, SellerResponse
 from app.schemas.product import ProductResponse, CategoryResponse
-from app.schemas.order import OrderResponse, PaymentResponse, SellerPayoutResponse
+from app.schemas.order import OrderResponse, OrderWithItems, PaymentResponse, SellerPayoutResponse
+from app.schemas.pagination import CursorPage
+from app.utils.pagination import apply_cursor, cursor_page
 from app.core.exceptions import NotFoundError
 
 router = APIRouter()
@@ -23,44 +28,67 @@ router = APIRouter()
 
 @router.get("/dashboard/stats")
 async def get_dashboard_stats(
-    admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    admin_user: User = Depends(require_admin)
 ):
     """Get admin dashboard statistics"""
+    # The dashboard aggregates are expensive and identical for every admin,
+    # so serve repeat hits from a short-TTL cache
+    cache_key = "admin:dashboard:stats"
+    cached = await get_cached_json(cache_key)
+    if cached is not None:
+        return cached
+
     # Get date range (last 30 days)
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    
-    # User statistics
-    total_users = db.query(User).count()
-    new_users = db.query(User).filter(User.created_at >= thirty_days_ago).count()
-    active_sellers = db.query(Seller).filter(Seller.is_active == True).count()
-    
-    # Product statistics
-    total_products = db.query(Product).count()
-    active_products = db.query(Product).filter(Product.status == "active").count()
-    pending_products = db.query(Product).filter(Product.status == "draft").count()
-    
-    # Order statistics
-    total_orders = db.query(Order).count()
-    recent_orders = db.query(Order).filter(Order.created_at >= thirty_days_ago).count()
-    pending_orders = db.query(Order).filter(Order.status == "pending").count()
-    
-    # Revenue statistics
-    total_revenue = db.query(func.sum(Order.total_amount)).filter(
-        Order.status.in_(["paid", "processing", "shipped", "delivered"])
-    ).scalar() or 0
-    
-    recent_revenue = db.query(func.sum(Order.total_amount)).filter(
-        Order.created_at >= thirty_days_ago,
-        Order.status.in_(["paid", "processing", "shipped", "delivered"])
-    ).scalar() or 0
-    
-    # Commission statistics
-    total_commission = db.query(func.sum(SellerPayout.commission_amount)).filter(
-        SellerPayout.status == "completed"
-    ).scalar() or 0
-    
-    return {
+
+    # Each table is scanned once with conditional aggregation instead of one
+    # round trip per statistic, and the per-table scans are independent, so
+    # they run concurrently on their own pooled sessions — total latency is
+    # the slowest scan rather than the sum
+    user_result, seller_result, product_result, order_result, commission_result = await asyncio.gather(
+        # User statistics
+        execute_detached(select(
+            func.count(User.id),
+            func.count(case((User.created_at >= thirty_days_ago, 1)))
+        )),
+        execute_detached(
+            select(func.count(Seller.id)).where(Seller.is_active == True)
+        ),
+        # Product statistics
+        execute_detached(select(
+            func.count(Product.id),
+            func.count(case((Product.status == "active", 1))),
+            func.count(case((Product.status == "draft", 1)))
+        )),
+        # Order and revenue statistics
+        execute_detached(select(
+            func.count(Order.id),
+            func.count(case((Order.created_at >= thirty_days_ago, 1))),
+            func.count(case((Order.status == "pending", 1))),
+            func.coalesce(func.sum(case(
+                (Order.status.in_(PAID_ORDER_STATUSES), Order.total_amount), else_=0
+            )), 0),
+            func.coalesce(func.sum(case(
+                (and_(Order.status.in_(PAID_ORDER_STATUSES), Order.created_at >= thirty_days_ago),
+                 Order.total_amount),
+                else_=0
+            )), 0)
+        )),
+        # Commission statistics
+        execute_detached(
+            select(func.sum(SellerPayout.commission_amount)).where(
+                SellerPayout.status == "completed"
+            )
+        )
+    )
+
+    total_users, new_users = user_result.one()
+    active_sellers = seller_result.scalar()
+    total_products, active_products, pending_products = product_result.one()
+    total_orders, recent_orders, pending_orders, total_revenue, recent_revenue = order_result.one()
+    total_commission = commission_result.scalar() or 0
+
+    stats = {
         "users": {
             "total": total_users,
             "new_last_30_days": new_users,
@@ -83,40 +111,45 @@ async def get_dashboard_stats(
         }
     }
 
+    await set_cached_json(cache_key, stats, ttl=60)
+    return stats
 
-@router.get("/users", response_model=List[UserResponse])
+
+@router.get("/users", response_model=CursorPage[UserResponse])
 async def get_all_users(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     role: UserRole = None,
     is_active: bool = None,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all users with filtering"""
-    query = db.query(User)
-    
+    query = select(User)
+
     if role:
-        query = query.filter(User.role == role)
-    
+        query = query.where(User.role == role)
+
     if is_active is not None:
-        query = query.filter(User.is_active == is_active)
-    
-    users = query.order_by(desc(User.created_at)).offset(skip).limit(limit).all()
-    return users
+        query = query.where(User.is_active == is_active)
+
+    result = await db.execute(apply_cursor(query, User, cursor, cursor_id, limit))
+    return cursor_page(result.scalars().all(), limit)
 
 
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def get_user_by_id(
     user_id: int,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user by ID"""
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalar_one_or_none()
     if not user:
         raise NotFoundError("User not found")
-    
+
     return user
 
 
@@ -124,16 +157,19 @@ async def get_user_by_id(
 async def activate_user(
     user_id: int,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Activate user"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # One UPDATE round trip; the MySQL dialect reports matched rows, so a
+    # zero rowcount means the user does not exist (RETURNING would need
+    # Postgres)
+    result = await db.execute(
+        update(User).where(User.id == user_id).values(is_active=True)
+    )
+    if result.rowcount == 0:
         raise NotFoundError("User not found")
-    
-    user.is_active = True
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "User activated successfully"}
 
 
@@ -141,16 +177,16 @@ async def activate_user(
 async def deactivate_user(
     user_id: int,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Deactivate user"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    result = await db.execute(
+        update(User).where(User.id == user_id).values(is_active=False)
+    )
+    if result.rowcount == 0:
         raise NotFoundError("User not found")
-    
-    user.is_active = False
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "User deactivated successfully"}
 
 
@@ -159,55 +195,56 @@ async def update_user_role(
     user_id: int,
     new_role: UserRole,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update user role"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    result = await db.execute(
+        update(User).where(User.id == user_id).values(role=new_role)
+    )
+    if result.rowcount == 0:
         raise NotFoundError("User not found")
-    
-    user.role = new_role
-    db.commit()
-    
+    await db.commit()
+
     return {"message": f"User role updated to {new_role}"}
 
 
-@router.get("/sellers", response_model=List[SellerResponse])
+@router.get("/sellers", response_model=CursorPage[SellerResponse])
 async def get_all_sellers(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     is_verified: bool = None,
     is_active: bool = None,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all sellers with filtering"""
-    query = db.query(Seller)
-    
+    query = select(Seller)
+
     if is_verified is not None:
-        query = query.filter(Seller.is_verified == is_verified)
-    
+        query = query.where(Seller.is_verified == is_verified)
+
     if is_active is not None:
-        query = query.filter(Seller.is_active == is_active)
-    
-    sellers = query.order_by(desc(Seller.created_at)).offset(skip).limit(limit).all()
-    return sellers
+        query = query.where(Seller.is_active == is_active)
+
+    result = await db.execute(apply_cursor(query, Seller, cursor, cursor_id, limit))
+    return cursor_page(result.scalars().all(), limit)
 
 
 @router.put("/sellers/{seller_id}/verify")
 async def verify_seller(
     seller_id: int,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Verify seller"""
-    seller = db.query(Seller).filter(Seller.id == seller_id).first()
-    if not seller:
+    result = await db.execute(
+        update(Seller).where(Seller.id == seller_id).values(is_verified=True)
+    )
+    if result.rowcount == 0:
         raise NotFoundError("Seller not found")
-    
-    seller.is_verified = True
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "Seller verified successfully"}
 
 
@@ -215,55 +252,56 @@ async def verify_seller(
 async def unverify_seller(
     seller_id: int,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Unverify seller"""
-    seller = db.query(Seller).filter(Seller.id == seller_id).first()
-    if not seller:
+    result = await db.execute(
+        update(Seller).where(Seller.id == seller_id).values(is_verified=False)
+    )
+    if result.rowcount == 0:
         raise NotFoundError("Seller not found")
-    
-    seller.is_verified = False
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "Seller unverified successfully"}
 
 
-@router.get("/products", response_model=List[ProductResponse])
+@router.get("/products", response_model=CursorPage[ProductResponse])
 async def get_all_products(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     status: str = None,
     seller_id: int = None,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all products with filtering"""
-    query = db.query(Product)
-    
+    query = select(Product)
+
     if status:
-        query = query.filter(Product.status == status)
-    
+        query = query.where(Product.status == status)
+
     if seller_id:
-        query = query.filter(Product.seller_id == seller_id)
-    
-    products = query.order_by(desc(Product.created_at)).offset(skip).limit(limit).all()
-    return products
+        query = query.where(Product.seller_id == seller_id)
+
+    result = await db.execute(apply_cursor(query, Product, cursor, cursor_id, limit))
+    return cursor_page(result.scalars().all(), limit)
 
 
 @router.put("/products/{product_id}/approve")
 async def approve_product(
     product_id: int,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Approve product"""
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+    result = await db.execute(
+        update(Product).where(Product.id == product_id).values(status="active")
+    )
+    if result.rowcount == 0:
         raise NotFoundError("Product not found")
-    
-    product.status = "active"
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "Product approved successfully"}
 
 
@@ -272,160 +310,196 @@ async def reject_product(
     product_id: int,
     reason: str = None,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Reject product"""
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+    result = await db.execute(
+        update(Product).where(Product.id == product_id).values(status="inactive")
+    )
+    if result.rowcount == 0:
         raise NotFoundError("Product not found")
-    
-    product.status = "inactive"
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "Product rejected successfully"}
 
 
-@router.get("/orders", response_model=List[OrderResponse])
+@router.get("/orders", response_model=CursorPage[OrderResponse])
 async def get_all_orders(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     status: str = None,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all orders with filtering"""
-    query = db.query(Order)
-    
+    # The list schema serializes no relationships; raiseload turns any
+    # accidental lazy access into an error instead of a hidden N+1
+    query = select(Order).options(raiseload('*'))
+
     if status:
-        query = query.filter(Order.status == status)
-    
-    orders = query.order_by(desc(Order.created_at)).offset(skip).limit(limit).all()
-    return orders
+        query = query.where(Order.status == status)
 
+    result = await db.execute(apply_cursor(query, Order, cursor, cursor_id, limit))
+    return cursor_page(result.scalars().all(), limit)
 
-@router.get("/orders/{order_id}", response_model=OrderResponse)
+
+@router.get("/orders/{order_id}", response_model=OrderWithItems)
 async def get_order_by_id(
     order_id: int,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get order by ID"""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    # Items are fetched eagerly in one extra SELECT rather than lazily per
+    # access
+    result = await db.execute(
+        select(Order).options(selectinload(Order.order_items)).where(Order.id == order_id)
+    )
+    order = result.scalar_one_or_none()
     if not order:
         raise NotFoundError("Order not found")
-    
+
     return order
 
 
-@router.get("/payments", response_model=List[PaymentResponse])
+@router.get("/payments", response_model=CursorPage[PaymentResponse])
 async def get_all_payments(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     status: str = None,
     gateway: str = None,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all payments with filtering"""
-    query = db.query(Payment)
-    
+    query = select(Payment).options(raiseload('*'))
+
     if status:
-        query = query.filter(Payment.status == status)
-    
+        query = query.where(Payment.status == status)
+
     if gateway:
-        query = query.filter(Payment.gateway == gateway)
-    
-    payments = query.order_by(desc(Payment.created_at)).offset(skip).limit(limit).all()
-    return payments
+        query = query.where(Payment.gateway == gateway)
+
+    result = await db.execute(apply_cursor(query, Payment, cursor, cursor_id, limit))
+    return cursor_page(result.scalars().all(), limit)
 
 
-@router.get("/payouts", response_model=List[SellerPayoutResponse])
+@router.get("/payouts", response_model=CursorPage[SellerPayoutResponse])
 async def get_all_payouts(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     status: str = None,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all seller payouts with filtering"""
-    query = db.query(SellerPayout)
-    
+    query = select(SellerPayout).options(raiseload('*'))
+
     if status:
-        query = query.filter(SellerPayout.status == status)
-    
-    payouts = query.order_by(desc(SellerPayout.created_at)).offset(skip).limit(limit).all()
-    return payouts
+        query = query.where(SellerPayout.status == status)
+
+    result = await db.execute(apply_cursor(query, SellerPayout, cursor, cursor_id, limit))
+    return cursor_page(result.scalars().all(), limit)
 
 
 @router.put("/payouts/{payout_id}/process")
 async def process_payout(
     payout_id: int,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Process seller payout"""
-    payout = db.query(SellerPayout).filter(SellerPayout.id == payout_id).first()
+    result = await db.execute(select(SellerPayout).where(SellerPayout.id == payout_id))
+    payout = result.scalar_one_or_none()
     if not payout:
         raise NotFoundError("Payout not found")
-    
+
     if payout.status != "pending":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Payout is not in pending status"
         )
-    
+
     # TODO: Implement actual payout processing (Stripe Connect, PayPal, etc.)
     payout.status = "processing"
     payout.processed_at = datetime.utcnow()
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "Payout processing initiated"}
 
 
 @router.get("/analytics/events")
 async def get_analytics_events(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     event_type: str = None,
     days: int = 7,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get analytics events"""
-    query = db.query(AnalyticsEvent)
-    
+    query = select(AnalyticsEvent)
+
     if event_type:
-        query = query.filter(AnalyticsEvent.event_type == event_type)
-    
+        query = query.where(AnalyticsEvent.event_type == event_type)
+
     # Filter by date range
     start_date = datetime.utcnow() - timedelta(days=days)
-    query = query.filter(AnalyticsEvent.created_at >= start_date)
-    
-    events = query.order_by(desc(AnalyticsEvent.created_at)).offset(skip).limit(limit).all()
-    
+    query = query.where(AnalyticsEvent.created_at >= start_date)
+
+    # COUNT(*) OVER () returns the total alongside the page in one scan
+    # instead of re-running the filters in a second count query; on cursor
+    # pages it counts the rows remaining from the cursor onward
+    result = await db.execute(apply_cursor(
+        query.add_columns(func.count().over().label("total_count")),
+        AnalyticsEvent, cursor, cursor_id, limit
+    ))
+    rows = result.all()
+
+    events = [row[0] for row in rows]
+
     return {
         "events": events,
-        "total_count": query.count()
+        "total_count": rows[0].total_count if rows else 0,
+        "next_cursor": events[-1].created_at if len(events) == limit else None,
+        "next_cursor_id": events[-1].id if len(events) == limit else None
     }
 
 
-@router.get("/notifications", response_model=List[Dict[str, Any]])
+@router.get("/notifications", response_model=CursorPage[Dict[str, Any]])
 async def get_notifications(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     is_read: bool = None,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all notifications"""
-    query = db.query(Notification)
-    
+    # Only the serialized columns are fetched; loading full ORM instances
+    # would pull every column and build identity-mapped objects just to
+    # copy seven fields out
+    query = select(
+        Notification.id,
+        Notification.user_id,
+        Notification.type,
+        Notification.title,
+        Notification.message,
+        Notification.is_read,
+        Notification.created_at
+    )
+
     if is_read is not None:
-        query = query.filter(Notification.is_read == is_read)
-    
-    notifications = query.order_by(desc(Notification.created_at)).offset(skip).limit(limit).all()
-    
-    return [
+        query = query.where(Notification.is_read == is_read)
+
+    result = await db.execute(apply_cursor(query, Notification, cursor, cursor_id, limit))
+    notifications = result.all()
+
+    return cursor_page(notifications, limit, items=[
         {
             "id": n.id,
             "user_id": n.user_id,
@@ -436,20 +510,33 @@ async def get_notifications(
             "created_at": n.created_at
         }
         for n in notifications
-    ]
+    ])
 
 
-@router.get("/messages", response_model=List[Dict[str, Any]])
+@router.get("/messages", response_model=CursorPage[Dict[str, Any]])
 async def get_messages(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all messages"""
-    messages = db.query(Message).order_by(desc(Message.created_at)).offset(skip).limit(limit).all()
-    
-    return [
+    query = select(
+        Message.id,
+        Message.from_user_id,
+        Message.to_user_id,
+        Message.order_id,
+        Message.content,
+        Message.message_type,
+        Message.is_read,
+        Message.created_at
+    )
+
+    result = await db.execute(apply_cursor(query, Message, cursor, cursor_id, limit))
+    messages = result.all()
+
+    return cursor_page(messages, limit, items=[
         {
             "id": m.id,
             "from_user_id": m.from_user_id,
@@ -461,7 +548,4 @@ async def get_messages(
             "created_at": m.created_at
         }
         for m in messages
-    ]
-
-
-
+    ])
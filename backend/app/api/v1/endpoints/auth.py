@@ -2,14 +2,15 @@
 Authentication endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from datetime import timedelta
-from app.core.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, bindparam, lambda_stmt
+from datetime import datetime, timedelta
+from app.core.database import get_async_db, AsyncSessionLocal
 from app.core.security import (
-    verify_password, get_password_hash, create_access_token,
-    get_current_user, get_current_active_user
+    averify_password, ahash_password, create_access_token,
+    get_current_user, get_current_active_user, invalidate_user_tokens
 )
 from app.core.config import settings
 from app.models.user import User, UserRole
@@ -18,33 +19,55 @@ from app.schemas.user import (
     PasswordResetConfirm, ChangePassword
 )
 from app.core.exceptions import AuthenticationError, ValidationError
-# from slowapi import Limiter
-# from slowapi.util import get_remote_address
+from app.core.rate_limit import rate_limit
 
 router = APIRouter()
-# limiter = Limiter(key_func=get_remote_address)
 
+# Statement construction is cached with lambda_stmt for the per-request
+# lookups, so repeat calls skip rebuilding the expression tree and go
+# straight to the compiled-SQL cache
+_USER_BY_EMAIL = lambda_stmt(
+    lambda: select(User).where(User.email == bindparam("email"))
+)
+_USER_ID_BY_EMAIL = lambda_stmt(
+    lambda: select(User.id).where(User.email == bindparam("email")).limit(1)
+)
 
-@router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
-# # @limiter.limit("5/minute")
+
+async def _update_last_login(user_id: int, timestamp) -> None:
+    """Record last_login on its own session, after the response is sent"""
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(User).where(User.id == user_id).values(last_login=timestamp)
+        )
+        await session.commit()
+
+
+@router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(rate_limit("register", capacity=5, refill_per_minute=5))])
 async def register(
     user_data: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Register a new user"""
-    # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
+    # Existence check only needs the id; hydrating the full row (hash and
+    # all) just to discard it wastes bandwidth and ORM work
+    result = await db.execute(_USER_ID_BY_EMAIL, {"email": user_data.email})
+    if result.scalar_one_or_none() is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    
+
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await ahash_password(user_data.password)
     # Use provided role or default to BUYER
     user_role = user_data.role if hasattr(user_data, 'role') and user_data.role else UserRole.BUYER
-    
+
+    # Timestamps are supplied here so the response needs no post-commit
+    # refresh SELECT (MySQL has no INSERT ... RETURNING); the generated id
+    # comes back with the INSERT itself
+    now = datetime.utcnow()
     db_user = User(
         name=user_data.name,
         email=user_data.email,
@@ -52,21 +75,21 @@ async def register(
         phone=user_data.phone,
         date_of_birth=user_data.date_of_birth,
         gender=user_data.gender,
-        role=user_role
+        role=user_role,
+        created_at=now,
+        updated_at=now
     )
-    
+
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
+    await db.commit()
+
     # Create access token for immediate login after registration
     access_token_expires = timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": str(db_user.id)}, expires_delta=access_token_expires
     )
-    
+
     # Return token response similar to login
-    from app.schemas.user import Token
     return Token(
         access_token=access_token,
         token_type="bearer",
@@ -74,33 +97,35 @@ async def register(
     )
 
 
-@router.post("/login", response_model=Token)
-# @limiter.limit("10/minute")
+@router.post("/login",
+             dependencies=[Depends(rate_limit("login", capacity=5, refill_per_minute=5))],
+             response_model=Token)
 async def login(
+    background_tasks: BackgroundTasks,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Login user and return access token"""
     # Find user by email
-    user = db.query(User).filter(User.email == form_data.username).first()
-    
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    result = await db.execute(_USER_BY_EMAIL, {"email": form_data.username})
+    user = result.scalar_one_or_none()
+
+    if not user or not await averify_password(form_data.password, user.hashed_password):
         raise AuthenticationError("Incorrect email or password")
-    
+
     if not user.is_active:
         raise AuthenticationError("Account is deactivated")
-    
-    # Update last login
-    from datetime import datetime
-    user.last_login = datetime.utcnow()
-    db.commit()
-    
+
+    # Record last login after the response goes out; the login itself stays
+    # read-only, saving an UPDATE plus commit on the critical path
+    background_tasks.add_task(_update_last_login, user.id, datetime.utcnow())
+
     # Create access token
     access_token_expires = timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": str(user.id)}, expires_delta=access_token_expires
     )
-    
+
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -117,7 +142,7 @@ async def refresh_token(
     access_token = create_access_token(
         data={"sub": str(current_user.id)}, expires_delta=access_token_expires
     )
-    
+
     return {
         "access_token": access_token,
         "token_type": "bearer",
@@ -133,48 +158,56 @@ async def get_current_user_info(
     return current_user
 
 
-@router.post("/change-password")
-# @limiter.limit("5/minute")
+@router.post("/change-password",
+             dependencies=[Depends(rate_limit("change-password", capacity=5, refill_per_minute=5))])
 async def change_password(
     password_data: ChangePassword,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Change user password"""
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await averify_password(password_data.current_password, current_user.hashed_password):
         raise AuthenticationError("Current password is incorrect")
-    
-    # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
-    
+
+    # Update password; the user was loaded by the auth dependency's session,
+    # so issue the change against this one by primary key
+    await db.execute(
+        update(User).where(User.id == current_user.id).values(
+            hashed_password=await ahash_password(password_data.new_password)
+        )
+    )
+    await db.commit()
+
+    # Cached token verifications for this user are now stale
+    invalidate_user_tokens(current_user.id)
+
     return {"message": "Password changed successfully"}
 
 
-@router.post("/forgot-password")
-# @limiter.limit("3/minute")
+@router.post("/forgot-password",
+             dependencies=[Depends(rate_limit("forgot-password", capacity=3, refill_per_minute=3))])
 async def forgot_password(
     email_data: PasswordReset,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send password reset email"""
-    user = db.query(User).filter(User.email == email_data.email).first()
-    
-    if not user:
+    result = await db.execute(_USER_ID_BY_EMAIL, {"email": email_data.email})
+
+    if result.scalar_one_or_none() is None:
         # Don't reveal if email exists or not
         return {"message": "If the email exists, a reset link has been sent"}
-    
+
     # TODO: Implement email sending with reset token
     # For now, just return success message
     return {"message": "If the email exists, a reset link has been sent"}
 
 
-@router.post("/reset-password")
-# @limiter.limit("5/minute")
+@router.post("/reset-password",
+             dependencies=[Depends(rate_limit("reset-password", capacity=5, refill_per_minute=5))])
 async def reset_password(
     reset_data: PasswordResetConfirm,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Reset password with token"""
     # TODO: Implement token verification and password reset
@@ -195,11 +228,11 @@ async def logout(
     return {"message": "Logged out successfully"}
 
 
-@router.post("/verify-email")
-# @limiter.limit("5/minute")
+@router.post("/verify-email",
+             dependencies=[Depends(rate_limit("verify-email", capacity=5, refill_per_minute=5))])
 async def verify_email(
     token: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Verify user email with token"""
     # TODO: Implement email verification
@@ -209,11 +242,11 @@ async def verify_email(
     )
 
 
-@router.post("/resend-verification")
-# @limiter.limit("3/minute")
+@router.post("/resend-verification",
+             dependencies=[Depends(rate_limit("resend-verification", capacity=3, refill_per_minute=3))])
 async def resend_verification(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Resend email verification"""
     if current_user.verified:
@@ -221,6 +254,6 @@ async def resend_verification(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already verified"
         )
-    
+
     # TODO: Implement resend verification email
     return {"message": "Verification email sent"}
@@ -3,12 +3,16 @@ Order management endpoints
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select, insert, update, delete, bindparam
 from typing import List
 from datetime import datetime
-from app.core.database import get_db
-from app.core.security import get_current_active_user, require_seller
-from app.models.user import User, UserRole, Seller
+from app.core.database import get_async_db
+from app.core.security import (
+    get_current_active_user, get_current_seller_id, resolve_seller_id
+)
+from app.models.user import User, UserRole
 from app.models.product import CartItem, Product
 from app.models.order import Order, OrderItem
 from app.schemas.order import (
@@ -16,10 +20,40 @@ from app.schemas.order import (
     OrderItemResponse, CheckoutRequest
 )
 from app.core.exceptions import NotFoundError, ValidationError
-import uuid
+from app.api.v1.endpoints.payments import redeem_coupon
+import secrets
 
 router = APIRouter()
 
+# Order numbers are ORD-YYYYMMDD-XXXXXXXX. The date prefix changes once a
+# day, so it is cached rather than re-running strftime per checkout; the
+# suffix is eight hex digits from the OS CSPRNG.
+_order_prefix = ("", None)
+
+# Columns OrderResponse serializes. The list endpoints select these
+# directly so each row skips ORM instrumentation and the identity map;
+# plain rows also cannot lazy-load anything by construction.
+_ORDER_LIST_COLUMNS = (
+    Order.id, Order.order_number, Order.buyer_id, Order.status,
+    Order.subtotal, Order.tax_amount, Order.shipping_amount,
+    Order.discount_amount, Order.total_amount, Order.currency,
+    Order.billing_address, Order.shipping_address, Order.notes,
+    Order.tracking_number, Order.shipped_at, Order.delivered_at,
+    Order.created_at, Order.updated_at,
+)
+
+
+def _order_number_prefix() -> str:
+    global _order_prefix
+    prefix, day = _order_prefix
+    # One UTC clock drives both the cache key and the rendered date, so
+    # the prefix can never go stale between local and UTC midnight
+    today = datetime.utcnow().date()
+    if day != today:
+        prefix = f"ORD-{today.strftime('%Y%m%d')}-"
+        _order_prefix = (prefix, today)
+    return prefix
+
 
 @router.get("/", response_model=List[OrderResponse])
 async def get_orders(
@@ -27,33 +61,39 @@ async def get_orders(
     limit: int = 20,
     status: str = None,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user orders"""
-    query = db.query(Order).filter(Order.buyer_id == current_user.id)
-    
+    query = select(*_ORDER_LIST_COLUMNS).where(Order.buyer_id == current_user.id)
+
     if status:
-        query = query.filter(Order.status == status)
-    
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
-    return orders
+        query = query.where(Order.status == status)
+
+    result = await db.execute(
+        query.order_by(Order.created_at.desc()).offset(skip).limit(limit)
+    )
+    return result.all()
 
 
 @router.get("/{order_id}", response_model=OrderWithItems)
 async def get_order(
     order_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get order by ID"""
-    order = db.query(Order).filter(
-        Order.id == order_id,
-        Order.buyer_id == current_user.id
-    ).first()
-    
+    # Items are loaded up front; async sessions have no implicit lazy loading
+    result = await db.execute(
+        select(Order).options(selectinload(Order.order_items)).where(
+            Order.id == order_id,
+            Order.buyer_id == current_user.id
+        )
+    )
+    order = result.scalar_one_or_none()
+
     if not order:
         raise NotFoundError("Order not found")
-    
+
     return order
 
 
@@ -61,25 +101,60 @@ async def get_order(
 async def create_order(
     checkout_data: CheckoutRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create order from cart items"""
-    # Get cart items
-    cart_items = db.query(CartItem).filter(CartItem.user_id == current_user.id).all()
-    
-    if not cart_items:
+    # Cart rows come back joined to their products in a single round trip
+    # (cart_items.product_id is a foreign key, so the join drops nothing);
+    # FOR UPDATE OF holds the product rows until commit so two concurrent
+    # checkouts cannot oversell
+    rows = (await db.execute(
+        select(CartItem, Product).join(
+            Product, Product.id == CartItem.product_id
+        ).where(CartItem.user_id == current_user.id).with_for_update(of=Product)
+    )).all()
+
+    if not rows:
         raise ValidationError("Cart is empty")
-    
-    # Calculate totals
-    subtotal = sum(item.price * item.quantity for item in cart_items)
+
+    # Validate stock, build the item rows, and total the cart in one pass;
+    # each line total is computed once and reused for both the subtotal and
+    # the item row. A SQL SUM(price * quantity) would mean a second round
+    # trip for rows this handler already holds.
+    subtotal = 0
+    order_items_payload = []
+    for cart_item, product in rows:
+        if product.stock < cart_item.quantity:
+            raise ValidationError(f"Insufficient stock for {product.title}")
+
+        line_total = cart_item.price * cart_item.quantity
+        subtotal += line_total
+        order_items_payload.append({
+            "product_id": cart_item.product_id,
+            "variation_id": cart_item.variation_id,
+            "seller_id": product.seller_id,
+            "product_title": product.title,
+            "product_sku": product.sku,
+            "quantity": cart_item.quantity,
+            "unit_price": cart_item.price,
+            "total_price": line_total
+        })
+
+    # Consume the coupon use atomically; rolls back with the rest of the
+    # checkout if anything below fails
+    if checkout_data.coupon_code:
+        await redeem_coupon(db, checkout_data.coupon_code)
+
     tax_amount = subtotal * 0.1  # 10% tax (should be configurable)
     shipping_amount = 0 if subtotal >= 50 else 10  # Free shipping over $50
     total_amount = subtotal + tax_amount + shipping_amount - checkout_data.discount_amount
-    
+
     # Generate order number
-    order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-    
-    # Create order
+    order_number = _order_number_prefix() + secrets.token_hex(4).upper()
+
+    # Create order; timestamps are supplied here so the response needs no
+    # post-commit refresh SELECT (MySQL has no INSERT ... RETURNING)
+    now = datetime.utcnow()
     order = Order(
         order_number=order_number,
         buyer_id=current_user.id,
@@ -90,47 +165,44 @@ async def create_order(
         total_amount=total_amount,
         billing_address=checkout_data.billing_address,
         shipping_address=checkout_data.shipping_address,
-        notes=checkout_data.notes
+        notes=checkout_data.notes,
+        created_at=now,
+        updated_at=now
     )
-    
+
     db.add(order)
-    db.flush()  # Get order ID
-    
-    # Create order items and update stock
-    for cart_item in cart_items:
-        # Check stock availability
-        product = db.query(Product).filter(Product.id == cart_item.product_id).first()
-        if not product:
-            raise ValidationError(f"Product {cart_item.product_id} not found")
-        
-        if product.stock < cart_item.quantity:
-            raise ValidationError(f"Insufficient stock for {product.title}")
-        
-        # Create order item
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=cart_item.product_id,
-            variation_id=cart_item.variation_id,
-            seller_id=product.seller_id,
-            product_title=product.title,
-            product_sku=product.sku,
-            quantity=cart_item.quantity,
-            unit_price=cart_item.price,
-            total_price=cart_item.price * cart_item.quantity
-        )
-        
-        db.add(order_item)
-        
-        # Update product stock
-        product.stock -= cart_item.quantity
-        product.sales_count += cart_item.quantity
-    
-    # Clear cart
-    db.query(CartItem).filter(CartItem.user_id == current_user.id).delete()
-    
-    db.commit()
-    db.refresh(order)
-    
+    await db.flush()  # Get order ID
+
+    for item in order_items_payload:
+        item["order_id"] = order.id
+
+    # One multi-row INSERT instead of a flush statement per item; the
+    # endpoint returns OrderResponse without items, so the rows never need
+    # ORM identities
+    await db.execute(insert(OrderItem), order_items_payload)
+
+    # Apply every stock decrement in one executemany UPDATE instead of a
+    # statement per product
+    await db.execute(
+        update(Product).where(Product.id == bindparam("pid")).values(
+            stock=Product.stock - bindparam("qty"),
+            sales_count=Product.sales_count + bindparam("qty")
+        ).execution_options(synchronize_session=False),
+        [
+            {"pid": cart_item.product_id, "qty": cart_item.quantity}
+            for cart_item, _ in rows
+        ]
+    )
+
+    # Clear cart; skip session synchronization — no CartItem objects were
+    # loaded into the session, so there is nothing to reconcile
+    await db.execute(
+        delete(CartItem).where(CartItem.user_id == current_user.id)
+        .execution_options(synchronize_session=False)
+    )
+
+    await db.commit()
+
     return order
 
 
@@ -139,49 +211,60 @@ async def update_order_status(
     order_id: int,
     status_update: OrderUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update order status"""
-    # Check if user is admin or seller
-    if current_user.role == UserRole.ADMIN:
-        order = db.query(Order).filter(Order.id == order_id).first()
-    elif current_user.role == UserRole.SELLER:
-        # Get seller profile
-        seller = db.query(Seller).filter(Seller.user_id == current_user.id).first()
-        if not seller:
+    # One query whatever the role: admins see any order, buyers their own,
+    # sellers orders containing their items — the EXISTS probe returns at
+    # most one order row, where the old join fanned out per matching item
+    conditions = [Order.id == order_id]
+    if current_user.role == UserRole.SELLER:
+        # Seller id comes from the short-lived cache
+        seller_id = await resolve_seller_id(db, current_user.id)
+        if seller_id is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Seller profile not found"
             )
-        
-        # Check if order contains seller's products
-        order = db.query(Order).join(OrderItem).filter(
-            Order.id == order_id,
-            OrderItem.seller_id == seller.id
-        ).first()
-    else:
-        # Regular user can only update their own orders
-        order = db.query(Order).filter(
-            Order.id == order_id,
-            Order.buyer_id == current_user.id
-        ).first()
-    
+        conditions.append(
+            select(OrderItem.id).where(
+                OrderItem.order_id == Order.id,
+                OrderItem.seller_id == seller_id
+            ).exists()
+        )
+    elif current_user.role != UserRole.ADMIN:
+        conditions.append(Order.buyer_id == current_user.id)
+
+    order = (await db.execute(
+        select(Order).where(*conditions)
+    )).scalar_one_or_none()
+
     if not order:
         raise NotFoundError("Order not found")
-    
-    # Update order fields
-    for field, value in status_update.dict(exclude_unset=True).items():
-        setattr(order, field, value)
-    
+
+    # Apply the change as one UPDATE with the values computed up front; no
+    # per-attribute change tracking, and no post-commit refresh SELECT
+    # (MySQL has no UPDATE ... RETURNING) — the loaded instance is patched
+    # below to mirror exactly what was written
+    now = datetime.utcnow()
+    values = status_update.dict(exclude_unset=True)
+
     # Set timestamps for status changes
     if status_update.status == "shipped":
-        order.shipped_at = datetime.utcnow()
+        values["shipped_at"] = now
     elif status_update.status == "delivered":
-        order.delivered_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(order)
-    
+        values["delivered_at"] = now
+    values["updated_at"] = now
+
+    await db.execute(
+        update(Order).where(Order.id == order.id).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+    for field, value in values.items():
+        setattr(order, field, value)
+
     return order
 
 
@@ -189,32 +272,50 @@ async def update_order_status(
 async def cancel_order(
     order_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cancel order"""
-    order = db.query(Order).filter(
-        Order.id == order_id,
-        Order.buyer_id == current_user.id
-    ).first()
-    
+    result = await db.execute(
+        select(Order).where(
+            Order.id == order_id,
+            Order.buyer_id == current_user.id
+        )
+    )
+    order = result.scalar_one_or_none()
+
     if not order:
         raise NotFoundError("Order not found")
-    
+
     if order.status not in ["pending", "paid"]:
         raise ValidationError("Order cannot be cancelled")
-    
+
     # Update order status
     order.status = "cancelled"
-    
-    # Restore product stock
-    for order_item in order.order_items:
-        product = db.query(Product).filter(Product.id == order_item.product_id).first()
-        if product:
-            product.stock += order_item.quantity
-            product.sales_count -= order_item.quantity
-    
-    db.commit()
-    
+
+    # Restore product stock. The items stream through as bare
+    # (product_id, quantity) rows fetched 100 at a time rather than a
+    # materialized ORM collection; only the two-field restock parameters
+    # are held, since the executemany UPDATE needs the full list once.
+    items = await db.stream(
+        select(OrderItem.product_id, OrderItem.quantity).where(
+            OrderItem.order_id == order.id
+        ).execution_options(yield_per=100)
+    )
+    restock = [
+        {"pid": product_id, "qty": quantity}
+        async for product_id, quantity in items
+    ]
+    if restock:
+        await db.execute(
+            update(Product).where(Product.id == bindparam("pid")).values(
+                stock=Product.stock + bindparam("qty"),
+                sales_count=Product.sales_count - bindparam("qty")
+            ).execution_options(synchronize_session=False),
+            restock
+        )
+
+    await db.commit()
+
     return {"message": "Order cancelled successfully"}
 
 
@@ -224,52 +325,43 @@ async def get_seller_orders(
     skip: int = 0,
     limit: int = 20,
     status: str = None,
-    current_user: User = Depends(require_seller),
-    db: Session = Depends(get_db)
+    seller_id: int = Depends(get_current_seller_id),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get seller orders"""
-    # Get seller profile
-    seller = db.query(Seller).filter(Seller.user_id == current_user.id).first()
-    if not seller:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Seller profile not found"
-        )
-    
-    # Get orders that contain seller's products
-    query = db.query(Order).join(OrderItem).filter(OrderItem.seller_id == seller.id)
-    
+    # Get orders that contain seller's products; DISTINCT folds the row
+    # fan-out when an order holds several of the seller's items
+    query = select(*_ORDER_LIST_COLUMNS).join(OrderItem).where(
+        OrderItem.seller_id == seller_id
+    ).distinct()
+
     if status:
-        query = query.filter(Order.status == status)
-    
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
-    return orders
+        query = query.where(Order.status == status)
+
+    result = await db.execute(
+        query.order_by(Order.created_at.desc()).offset(skip).limit(limit)
+    )
+    return result.all()
 
 
 @router.get("/seller/orders/{order_id}", response_model=OrderWithItems)
 async def get_seller_order(
     order_id: int,
-    current_user: User = Depends(require_seller),
-    db: Session = Depends(get_db)
+    seller_id: int = Depends(get_current_seller_id),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get seller order by ID"""
-    # Get seller profile
-    seller = db.query(Seller).filter(Seller.user_id == current_user.id).first()
-    if not seller:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Seller profile not found"
-        )
-    
     # Get order that contains seller's products
-    order = db.query(Order).join(OrderItem).filter(
-        Order.id == order_id,
-        OrderItem.seller_id == seller.id
-    ).first()
-    
+    order = (await db.execute(
+        select(Order).options(selectinload(Order.order_items)).join(OrderItem).where(
+            Order.id == order_id,
+            OrderItem.seller_id == seller_id
+        )
+    )).scalars().first()
+
     if not order:
         raise NotFoundError("Order not found")
-    
+
     return order
 
 
@@ -277,38 +369,31 @@ async def get_seller_order(
 async def fulfill_order(
     order_id: int,
     tracking_number: str = None,
-    current_user: User = Depends(require_seller),
-    db: Session = Depends(get_db)
+    seller_id: int = Depends(get_current_seller_id),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark order as fulfilled by seller"""
-    # Get seller profile
-    seller = db.query(Seller).filter(Seller.user_id == current_user.id).first()
-    if not seller:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Seller profile not found"
-        )
-    
     # Get order that contains seller's products
-    order = db.query(Order).join(OrderItem).filter(
-        Order.id == order_id,
-        OrderItem.seller_id == seller.id
-    ).first()
-    
+    order = (await db.execute(
+        select(Order).join(OrderItem).where(
+            Order.id == order_id,
+            OrderItem.seller_id == seller_id
+        )
+    )).scalars().first()
+
     if not order:
         raise NotFoundError("Order not found")
-    
+
     if order.status not in ["paid", "processing"]:
         raise ValidationError("Order cannot be fulfilled")
-    
+
     # Update order status
     order.status = "shipped"
     order.shipped_at = datetime.utcnow()
-    
+
     if tracking_number:
         order.tracking_number = tracking_number
-    
-    db.commit()
-    
-    return {"message": "Order fulfilled successfully"}
 
+    await db.commit()
+
+    return {"message": "Order fulfilled successfully"}
@@ -2,27 +2,44 @@
 Payment processing endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select, insert, update, or_
+from typing import List, Optional
+import asyncio
 import stripe
 import paypalrestsdk
 from datetime import datetime
-from app.core.database import get_db
-from app.core.security import get_current_active_user, require_admin
+from decimal import Decimal
+from app.core.database import get_async_db, AsyncSessionLocal
+from app.core.cache import get_cached_json, set_cached_json, delete_cached_json
+from app.core.security import get_current_active_user, get_current_seller_id, require_admin
 from app.core.config import settings
-from app.models.user import User, UserRole
+from app.models.user import User
 from app.models.order import Order, Payment, SellerPayout, Coupon
 from app.schemas.order import (
     PaymentResponse, PaymentCreate, StripePaymentRequest, PayPalPaymentRequest,
     PaymentWebhook, SellerPayoutResponse, CouponResponse, CouponCreate,
     CouponUpdate, CouponValidation
 )
+from app.schemas.pagination import CursorPage
+from app.utils.pagination import apply_cursor, cursor_page
 from app.core.exceptions import NotFoundError, ValidationError, PaymentError
 import json
 
 router = APIRouter()
 
+# Columns coupon validation reads. Selecting them directly skips ORM
+# instrumentation and the identity map for a row that only gets turned
+# into a cacheable dict.
+_COUPON_COLUMNS = (
+    Coupon.id, Coupon.code, Coupon.name, Coupon.description, Coupon.type,
+    Coupon.value, Coupon.minimum_amount, Coupon.maximum_discount,
+    Coupon.usage_limit, Coupon.used_count, Coupon.user_limit,
+    Coupon.valid_from, Coupon.valid_until, Coupon.is_active,
+)
+
 # Configure Stripe
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -38,24 +55,30 @@ paypalrestsdk.configure({
 async def create_stripe_payment_intent(
     payment_request: StripePaymentRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create Stripe payment intent"""
     # Get order
-    order = db.query(Order).filter(
-        Order.id == payment_request.order_id,
-        Order.buyer_id == current_user.id
-    ).first()
-    
+    result = await db.execute(
+        select(Order).where(
+            Order.id == payment_request.order_id,
+            Order.buyer_id == current_user.id
+        )
+    )
+    order = result.scalar_one_or_none()
+
     if not order:
         raise NotFoundError("Order not found")
-    
+
     if order.status != "pending":
         raise ValidationError("Order is not in pending status")
-    
+
     try:
-        # Create payment intent
-        intent = stripe.PaymentIntent.create(
+        # Create payment intent. The SDK call is a blocking HTTP round
+        # trip to Stripe, so it runs on a worker thread rather than
+        # pinning the event loop for its duration
+        intent = await asyncio.to_thread(
+            stripe.PaymentIntent.create,
             amount=int(order.total_amount * 100),  # Convert to cents
             currency=order.currency.lower(),
             payment_method=payment_request.payment_method_id,
@@ -67,7 +90,7 @@ async def create_stripe_payment_intent(
                 'user_id': str(current_user.id)
             }
         )
-        
+
         # Create payment record
         payment = Payment(
             order_id=order.id,
@@ -78,16 +101,16 @@ async def create_stripe_payment_intent(
             transaction_id=intent.id,
             gateway_response=intent
         )
-        
+
         db.add(payment)
-        db.commit()
-        
+        await db.commit()
+
         return {
             "client_secret": intent.client_secret,
             "status": intent.status,
             "payment_id": payment.id
         }
-        
+
     except stripe.error.StripeError as e:
         raise PaymentError(f"Stripe error: {str(e)}")
 
@@ -95,12 +118,12 @@ async def create_stripe_payment_intent(
 @router.post("/stripe/webhook")
 async def stripe_webhook(
     request: Request,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks
 ):
     """Handle Stripe webhook events"""
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
-    
+
     try:
         event = stripe.Webhook.construct_event(
             payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
@@ -109,95 +132,113 @@ async def stripe_webhook(
         raise HTTPException(status_code=400, detail="Invalid payload")
     except stripe.error.SignatureVerificationError:
         raise HTTPException(status_code=400, detail="Invalid signature")
-    
-    # Handle the event
+
+    # Acknowledge as soon as the signature checks out; Stripe only needs
+    # the 200, and a slow handler here risks its delivery timeout and a
+    # redundant retry. The database work runs after the response goes out.
     if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        await handle_successful_payment(payment_intent, db)
+        background_tasks.add_task(handle_successful_payment, event['data']['object'])
     elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        await handle_failed_payment(payment_intent, db)
-    
+        background_tasks.add_task(handle_failed_payment, event['data']['object'])
+
     return {"status": "success"}
 
 
-async def handle_successful_payment(payment_intent, db: Session):
-    """Handle successful payment"""
+async def handle_successful_payment(payment_intent):
+    """Handle successful payment on its own session, after the response"""
     order_id = payment_intent['metadata']['order_id']
-    
-    # Update order status
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if order:
-        order.status = "paid"
-    
-    # Update payment status
-    payment = db.query(Payment).filter(
-        Payment.transaction_id == payment_intent['id']
-    ).first()
-    if payment:
-        payment.status = "completed"
-        payment.processed_at = datetime.utcnow()
-    
-    # Create seller payouts
-    await create_seller_payouts(order, db)
-    
-    db.commit()
-
-
-async def handle_failed_payment(payment_intent, db: Session):
-    """Handle failed payment"""
-    # Update payment status
-    payment = db.query(Payment).filter(
-        Payment.transaction_id == payment_intent['id']
-    ).first()
-    if payment:
-        payment.status = "failed"
-        payment.failure_reason = payment_intent.get('last_payment_error', {}).get('message', 'Payment failed')
-    
-    db.commit()
-
-
-async def create_seller_payouts(order: Order, db: Session):
+
+    async with AsyncSessionLocal() as db:
+        # Update order status; items are loaded up front because the payout
+        # step walks them (async sessions have no implicit lazy loading)
+        result = await db.execute(
+            select(Order).options(selectinload(Order.order_items)).where(
+                Order.id == order_id
+            )
+        )
+        order = result.scalar_one_or_none()
+        if order:
+            order.status = "paid"
+
+        # Update payment status
+        result = await db.execute(
+            select(Payment).where(Payment.transaction_id == payment_intent['id'])
+        )
+        payment = result.scalar_one_or_none()
+        if payment:
+            payment.status = "completed"
+            payment.processed_at = datetime.utcnow()
+
+        # Create seller payouts
+        await create_seller_payouts(order, db)
+
+        await db.commit()
+
+
+async def handle_failed_payment(payment_intent):
+    """Handle failed payment on its own session, after the response"""
+    async with AsyncSessionLocal() as db:
+        # Update payment status
+        result = await db.execute(
+            select(Payment).where(Payment.transaction_id == payment_intent['id'])
+        )
+        payment = result.scalar_one_or_none()
+        if payment:
+            payment.status = "failed"
+            payment.failure_reason = payment_intent.get('last_payment_error', {}).get('message', 'Payment failed')
+
+        await db.commit()
+
+
+async def create_seller_payouts(order: Order, db: AsyncSession):
     """Create seller payouts for order items"""
-    commission_rate = settings.PLATFORM_COMMISSION_RATE
-    
+    # The rate is converted to Decimal once, outside the loop; total_price
+    # comes back from a DECIMAL column and Decimal arithmetic with a float
+    # would fail item by item
+    commission_rate = Decimal(str(settings.PLATFORM_COMMISSION_RATE))
+
+    # One multi-row INSERT instead of a flushed statement per payout; the
+    # rows are write-only bookkeeping, so they never need ORM identities
+    payouts = []
     for order_item in order.order_items:
         commission_amount = order_item.total_price * commission_rate
-        net_amount = order_item.total_price - commission_amount
-        
-        payout = SellerPayout(
-            seller_id=order_item.seller_id,
-            order_id=order.id,
-            order_item_id=order_item.id,
-            amount=order_item.total_price,
-            commission_rate=commission_rate,
-            commission_amount=commission_amount,
-            net_amount=net_amount,
-            status="pending"
-        )
-        
-        db.add(payout)
+        payouts.append({
+            "seller_id": order_item.seller_id,
+            "order_id": order.id,
+            "order_item_id": order_item.id,
+            "amount": order_item.total_price,
+            "commission_rate": commission_rate,
+            "commission_amount": commission_amount,
+            "net_amount": order_item.total_price - commission_amount,
+            "status": "pending"
+        })
+
+    if payouts:
+        await db.execute(insert(SellerPayout), payouts)
 
 
 @router.post("/paypal/create-order", response_model=dict)
 async def create_paypal_order(
     payment_request: PayPalPaymentRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create PayPal order"""
     # Get order
-    order = db.query(Order).filter(
-        Order.id == payment_request.order_id,
-        Order.buyer_id == current_user.id
-    ).first()
-    
+    result = await db.execute(
+        select(Order).where(
+            Order.id == payment_request.order_id,
+            Order.buyer_id == current_user.id
+        )
+    )
+    order = result.scalar_one_or_none()
+
     if not order:
         raise NotFoundError("Order not found")
-    
+
     if order.status != "pending":
         raise ValidationError("Order is not in pending status")
-    
+
     try:
         # Create PayPal payment
         payment = paypalrestsdk.Payment({
@@ -218,8 +259,9 @@ async def create_paypal_order(
                 "custom": str(order.id)
             }]
         })
-        
-        if payment.create():
+
+        # create() is a blocking HTTP call to PayPal; run it off-loop
+        if await asyncio.to_thread(payment.create):
             # Create payment record
             db_payment = Payment(
                 order_id=order.id,
@@ -230,17 +272,17 @@ async def create_paypal_order(
                 transaction_id=payment.id,
                 gateway_response=payment.to_dict()
             )
-            
+
             db.add(db_payment)
-            db.commit()
-            
+            await db.commit()
+
             # Get approval URL
             approval_url = None
             for link in payment.links:
                 if link.rel == "approval_url":
                     approval_url = link.href
                     break
-            
+
             return {
                 "payment_id": payment.id,
                 "approval_url": approval_url,
@@ -248,7 +290,7 @@ async def create_paypal_order(
             }
         else:
             raise PaymentError(f"PayPal error: {payment.error}")
-            
+
     except Exception as e:
         raise PaymentError(f"PayPal error: {str(e)}")
 
@@ -257,83 +299,78 @@ async def create_paypal_order(
 async def execute_paypal_payment(
     payment_id: str,
     payer_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Execute PayPal payment"""
     try:
-        payment = paypalrestsdk.Payment.find(payment_id)
-        
-        if payment.execute({"payer_id": payer_id}):
+        # Both SDK calls block on HTTP round trips to PayPal; run them on
+        # worker threads so the event loop keeps serving other requests
+        payment = await asyncio.to_thread(paypalrestsdk.Payment.find, payment_id)
+
+        if await asyncio.to_thread(payment.execute, {"payer_id": payer_id}):
             # Update payment status
-            db_payment = db.query(Payment).filter(
-                Payment.transaction_id == payment_id
-            ).first()
-            
+            result = await db.execute(
+                select(Payment).where(Payment.transaction_id == payment_id)
+            )
+            db_payment = result.scalar_one_or_none()
+
             if db_payment:
                 db_payment.status = "completed"
                 db_payment.processed_at = datetime.utcnow()
-                
-                # Update order status
-                order = db.query(Order).filter(Order.id == db_payment.order_id).first()
+
+                # Update order status; items loaded for the payout step
+                result = await db.execute(
+                    select(Order).options(selectinload(Order.order_items)).where(
+                        Order.id == db_payment.order_id
+                    )
+                )
+                order = result.scalar_one_or_none()
                 if order:
                     order.status = "paid"
-                
+
                 # Create seller payouts
                 await create_seller_payouts(order, db)
-                
-                db.commit()
-            
+
+                await db.commit()
+
             return {"status": "success", "payment_id": payment_id}
         else:
             raise PaymentError(f"PayPal execution failed: {payment.error}")
-            
+
     except Exception as e:
         raise PaymentError(f"PayPal error: {str(e)}")
 
 
-@router.get("/history", response_model=List[PaymentResponse])
+@router.get("/history", response_model=CursorPage[PaymentResponse])
 async def get_payment_history(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 20,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user payment history"""
-    payments = db.query(Payment).join(Order).filter(
-        Order.buyer_id == current_user.id
-    ).order_by(Payment.created_at.desc()).offset(skip).limit(limit).all()
-    
-    return payments
+    # Keyset pagination seeks past the cursor row instead of discarding
+    # OFFSET rows on deep pages
+    query = select(Payment).join(Order).where(Order.buyer_id == current_user.id)
 
+    result = await db.execute(apply_cursor(query, Payment, cursor, cursor_id, limit))
+    return cursor_page(result.scalars().all(), limit)
 
-@router.get("/payouts", response_model=List[SellerPayoutResponse])
+
+@router.get("/payouts", response_model=CursorPage[SellerPayoutResponse])
 async def get_seller_payouts(
-    skip: int = 0,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[int] = None,
     limit: int = 20,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    seller_id: int = Depends(get_current_seller_id),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get seller payouts"""
-    if current_user.role not in [UserRole.SELLER, UserRole.ADMIN]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Seller access required"
-        )
-    
-    # Get seller profile
-    from app.models.user import Seller
-    seller = db.query(Seller).filter(Seller.user_id == current_user.id).first()
-    if not seller:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Seller profile not found"
-        )
-    
-    payouts = db.query(SellerPayout).filter(
-        SellerPayout.seller_id == seller.id
-    ).order_by(SellerPayout.created_at.desc()).offset(skip).limit(limit).all()
-    
-    return payouts
+    query = select(SellerPayout).where(SellerPayout.seller_id == seller_id)
+
+    result = await db.execute(apply_cursor(query, SellerPayout, cursor, cursor_id, limit))
+    return cursor_page(result.scalars().all(), limit)
 
 
 # Coupon endpoints
@@ -342,82 +379,143 @@ async def get_coupons(
     skip: int = 0,
     limit: int = 20,
     is_active: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get active coupons"""
-    coupons = db.query(Coupon).filter(
-        Coupon.is_active == is_active
-    ).order_by(Coupon.created_at.desc()).offset(skip).limit(limit).all()
-    
-    return coupons
+    result = await db.execute(
+        select(Coupon).where(
+            Coupon.is_active == is_active
+        ).order_by(Coupon.created_at.desc()).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
 
 
 @router.post("/coupons/validate", response_model=dict)
 async def validate_coupon(
     coupon_data: CouponValidation,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Validate coupon code"""
-    coupon = db.query(Coupon).filter(
-        Coupon.code == coupon_data.code,
-        Coupon.is_active == True
-    ).first()
-    
-    if not coupon:
-        raise ValidationError("Invalid coupon code")
-    
+    # Coupons change rarely but get validated on every checkout attempt,
+    # so the row is served from Redis for a minute at a time. Decimals and
+    # datetimes are stored as strings and parsed back on both paths so
+    # cache hits and misses validate identically. used_count can lag by
+    # the TTL; the redemption step re-checks the limit authoritatively.
+    cache_key = f"coupon:{coupon_data.code}"
+    fields = await get_cached_json(cache_key)
+
+    if fields is None:
+        coupon = (await db.execute(
+            select(*_COUPON_COLUMNS).where(
+                Coupon.code == coupon_data.code,
+                Coupon.is_active == True
+            )
+        )).first()
+
+        if not coupon:
+            raise ValidationError("Invalid coupon code")
+
+        fields = {
+            "id": coupon.id,
+            "code": coupon.code,
+            "name": coupon.name,
+            "description": coupon.description,
+            "type": coupon.type,
+            "value": str(coupon.value),
+            "minimum_amount": str(coupon.minimum_amount) if coupon.minimum_amount is not None else None,
+            "maximum_discount": str(coupon.maximum_discount) if coupon.maximum_discount is not None else None,
+            "usage_limit": coupon.usage_limit,
+            "used_count": coupon.used_count,
+            "user_limit": coupon.user_limit,
+            "valid_from": coupon.valid_from.isoformat(),
+            "valid_until": coupon.valid_until.isoformat(),
+            "is_active": coupon.is_active
+        }
+        await set_cached_json(cache_key, fields, ttl=60)
+
+    value = Decimal(fields["value"])
+    minimum_amount = Decimal(fields["minimum_amount"]) if fields["minimum_amount"] is not None else None
+    maximum_discount = Decimal(fields["maximum_discount"]) if fields["maximum_discount"] is not None else None
+
     # Check validity dates
-    from datetime import datetime
     now = datetime.utcnow()
-    if now < coupon.valid_from or now > coupon.valid_until:
+    if now < datetime.fromisoformat(fields["valid_from"]) or now > datetime.fromisoformat(fields["valid_until"]):
         raise ValidationError("Coupon has expired")
-    
+
     # Check usage limit
-    if coupon.usage_limit and coupon.used_count >= coupon.usage_limit:
+    if fields["usage_limit"] and fields["used_count"] >= fields["usage_limit"]:
         raise ValidationError("Coupon usage limit exceeded")
-    
+
     # Check minimum amount
-    if coupon.minimum_amount and coupon_data.order_amount < coupon.minimum_amount:
-        raise ValidationError(f"Minimum order amount of ${coupon.minimum_amount} required")
-    
+    if minimum_amount and coupon_data.order_amount < minimum_amount:
+        raise ValidationError(f"Minimum order amount of ${minimum_amount} required")
+
     # Calculate discount
-    if coupon.type == "percentage":
-        discount_amount = coupon_data.order_amount * (coupon.value / 100)
-        if coupon.maximum_discount:
-            discount_amount = min(discount_amount, coupon.maximum_discount)
-    elif coupon.type == "fixed_amount":
-        discount_amount = coupon.value
+    if fields["type"] == "percentage":
+        discount_amount = coupon_data.order_amount * (value / 100)
+        if maximum_discount:
+            discount_amount = min(discount_amount, maximum_discount)
+    elif fields["type"] == "fixed_amount":
+        discount_amount = value
     else:  # free_shipping
         discount_amount = 0  # Will be handled separately
-    
+
     return {
         "valid": True,
         "discount_amount": discount_amount,
-        "coupon": coupon
+        "coupon": fields
     }
 
 
+async def redeem_coupon(db: AsyncSession, code: str) -> None:
+    """Atomically consume one use of a coupon, enforcing its limits
+
+    The guard and the increment happen in one UPDATE, so two concurrent
+    checkouts cannot both pass a used_count check and overshoot the usage
+    limit the way a SELECT-then-increment would. Zero affected rows means
+    the coupon is missing, inactive, outside its window, or exhausted
+    (MySQL has no UPDATE ... RETURNING to say which). Runs inside the
+    caller's transaction so a failed checkout rolls the use back.
+    """
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(Coupon).where(
+            Coupon.code == code,
+            Coupon.is_active == True,
+            Coupon.valid_from <= now,
+            Coupon.valid_until >= now,
+            or_(Coupon.usage_limit.is_(None), Coupon.used_count < Coupon.usage_limit)
+        ).values(used_count=Coupon.used_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        raise ValidationError("Invalid or exhausted coupon code")
+
+    # Validation caches this row; drop it so used_count does not lag
+    await delete_cached_json(f"coupon:{code}")
+
+
 @router.post("/coupons", response_model=CouponResponse, status_code=status.HTTP_201_CREATED)
 async def create_coupon(
     coupon_data: CouponCreate,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create coupon (admin only)"""
     # Check if code already exists
-    existing_coupon = db.query(Coupon).filter(Coupon.code == coupon_data.code).first()
-    if existing_coupon:
+    result = await db.execute(select(Coupon).where(Coupon.code == coupon_data.code))
+    if result.scalar_one_or_none():
         raise ValidationError("Coupon code already exists")
-    
+
     coupon = Coupon(
         **coupon_data.dict(),
         created_by=current_user.id
     )
-    
+
     db.add(coupon)
-    db.commit()
-    db.refresh(coupon)
-    
+    await db.commit()
+    await db.refresh(coupon)
+
     return coupon
 
 
@@ -426,20 +524,24 @@ async def update_coupon(
     coupon_id: int,
     coupon_update: CouponUpdate,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update coupon (admin only)"""
-    coupon = db.query(Coupon).filter(Coupon.id == coupon_id).first()
+    result = await db.execute(select(Coupon).where(Coupon.id == coupon_id))
+    coupon = result.scalar_one_or_none()
     if not coupon:
         raise NotFoundError("Coupon not found")
-    
+
     # Update coupon fields
     for field, value in coupon_update.dict(exclude_unset=True).items():
         setattr(coupon, field, value)
-    
-    db.commit()
-    db.refresh(coupon)
-    
+
+    await db.commit()
+    await db.refresh(coupon)
+
+    # Validation serves this code from Redis; drop the stale entry
+    await delete_cached_json(f"coupon:{coupon.code}")
+
     return coupon
 
 
@@ -447,14 +549,19 @@ async def update_coupon(
 async def delete_coupon(
     coupon_id: int,
     current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete coupon (admin only)"""
-    coupon = db.query(Coupon).filter(Coupon.id == coupon_id).first()
+    result = await db.execute(select(Coupon).where(Coupon.id == coupon_id))
+    coupon = result.scalar_one_or_none()
     if not coupon:
         raise NotFoundError("Coupon not found")
-    
-    db.delete(coupon)
-    db.commit()
-    
+
+    code = coupon.code
+    await db.delete(coupon)
+    await db.commit()
+
+    # Validation serves this code from Redis; drop the stale entry
+    await delete_cached_json(f"coupon:{code}")
+
     return {"message": "Coupon deleted successfully"}
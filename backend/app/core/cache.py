@@ -0,0 +1,55 @@
+"""
+Redis-backed response caching helpers
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from app.core.redis_client import redis_client
+
+
+def _json_default(value: Any) -> Any:
+    """Encode non-JSON types the way the uncached response path does
+
+    Decimals become JSON numbers and datetimes ISO strings, matching
+    FastAPI's response encoding — a bare str() fallback would turn Decimal
+    aggregates into strings on cache hits while misses return numbers.
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+async def get_cached_json(key: str) -> Optional[Any]:
+    """Get a cached JSON payload, or None on miss (or Redis being down)"""
+    try:
+        cached = await redis_client.get(key)
+    except Exception:
+        return None
+
+    if cached is None:
+        return None
+
+    return json.loads(cached)
+
+
+async def set_cached_json(key: str, payload: Any, ttl: int = 60) -> None:
+    """Cache a JSON-serializable payload for ttl seconds (best effort)"""
+    try:
+        await redis_client.setex(key, ttl, json.dumps(payload, default=_json_default))
+    except Exception:
+        # Caching is an optimization; never fail the request over it
+        pass
+
+
+async def delete_cached_json(key: str) -> None:
+    """Drop a cached payload after the underlying data changes (best effort)"""
+    try:
+        await redis_client.delete(key)
+    except Exception:
+        # The entry expires on its own TTL if Redis is unreachable
+        pass
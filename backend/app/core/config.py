@@ -22,6 +22,9 @@ class Settings(BaseSettings):
     DB_NAME: str = "marketplace"
     DB_USER: str = "root"
     DB_PASSWORD: str = "password"
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_TIMEOUT: int = 30
     
     # JWT
     JWT_SECRET_KEY: str = "your-super-secret-jwt-key-here"
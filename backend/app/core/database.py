@@ -2,14 +2,33 @@
 Database configuration and session management
 """
 
+import asyncio
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
 
-# Create database engine
+# Create database engine. Both engines share the same sizing knobs so a
+# checkout waits at most pool_timeout seconds instead of hanging when the
+# pool is exhausted under a webhook burst.
 engine = create_engine(
     settings.DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    echo=settings.DEBUG
+)
+
+# Async engine for endpoints that await their queries instead of blocking
+# the event loop; asyncmy is the async counterpart of the pymysql driver
+async_engine = create_async_engine(
+    settings.DATABASE_URL.replace("mysql+pymysql", "mysql+asyncmy"),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
     pool_pre_ping=True,
     pool_recycle=300,
     echo=settings.DEBUG
@@ -18,6 +37,10 @@ engine = create_engine(
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 # Create base class for models
 Base = declarative_base()
 
@@ -30,3 +53,33 @@ def get_db() -> Session:
     finally:
         db.close()
 
+
+async def get_async_db() -> AsyncSession:
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def execute_detached(stmt):
+    """Execute one statement on its own pooled session.
+
+    An AsyncSession rejects concurrent queries, so independent statements
+    that should overlap via asyncio.gather each borrow a session from the
+    pool; the buffered result stays usable after the session closes.
+    """
+    async with AsyncSessionLocal() as session:
+        return await session.execute(stmt)
+
+
+async def warm_async_pool() -> None:
+    """Open and release pool_size connections to prime the async pool
+
+    Without this the first pool_size requests each pay the TCP and auth
+    handshake; opening the connections concurrently at startup moves that
+    cost out of the request path.
+    """
+    connections = await asyncio.gather(
+        *[async_engine.connect() for _ in range(settings.DB_POOL_SIZE)]
+    )
+    for connection in connections:
+        await connection.close()
@@ -0,0 +1,62 @@
+"""
+Redis-backed token-bucket rate limiting
+"""
+
+import time
+from fastapi import HTTPException, Request, status
+from app.core.redis_client import redis_client
+
+# Refill-and-take in one atomic step so concurrent requests cannot both
+# spend the last token. KEYS[1] holds "tokens timestamp"; ARGV carries
+# capacity, refill rate (tokens/second), and the current time.
+_TOKEN_BUCKET_LUA = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+return allowed
+"""
+
+_token_bucket_script = redis_client.register_script(_TOKEN_BUCKET_LUA)
+
+
+def rate_limit(bucket: str, capacity: int, refill_per_minute: float):
+    """Dependency factory limiting a route per client IP
+
+    Each (bucket, IP) pair gets a token bucket of the given capacity that
+    refills at refill_per_minute tokens per minute; requests beyond it are
+    rejected with 429 before the handler runs. Redis failures fail open so
+    a cache outage cannot take down authentication.
+    """
+    async def limiter(request: Request) -> None:
+        client_ip = request.client.host if request.client else "unknown"
+        try:
+            allowed = await _token_bucket_script(
+                keys=[f"ratelimit:{bucket}:{client_ip}"],
+                args=[capacity, refill_per_minute / 60.0, time.time()]
+            )
+        except Exception:
+            return
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later"
+            )
+    return limiter
@@ -4,14 +4,21 @@ Security utilities for authentication and authorization
 
 from datetime import datetime, timedelta
 from typing import Optional, Union
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select, bindparam, lambda_stmt
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
-from app.core.database import get_db
-from app.models.user import User, UserRole
+from app.core.database import get_db, get_async_db
+from app.models.user import User, UserRole, Seller
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,6 +26,26 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # JWT token scheme
 security = HTTPBearer()
 
+# Short-lived cache of verified tokens: sha256(token) -> user id. Repeat
+# requests within the TTL skip the JWT signature check; the raw token is
+# never stored. Only the immutable id is cached — the user row itself is
+# loaded into each request's own session, so no detached ORM instance is
+# ever shared across requests.
+_token_cache = TTLCache(maxsize=10000, ttl=30)
+_token_cache_lock = threading.Lock()
+
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()[:16]
+
+
+def invalidate_user_tokens(user_id: int) -> None:
+    """Drop cached token verifications for a user after a credential change"""
+    with _token_cache_lock:
+        stale = [key for key, uid in _token_cache.items() if uid == user_id]
+        for key in stale:
+            del _token_cache[key]
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -30,6 +57,26 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# bcrypt burns ~100ms of CPU per call and its C core releases the GIL, so
+# a small thread pool keeps that work off the event loop without the
+# memory cost of worker processes
+_bcrypt_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bcrypt")
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _bcrypt_executor, verify_password, plain_password, hashed_password
+    )
+
+
+async def ahash_password(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _bcrypt_executor, get_password_hash, password
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -64,24 +111,31 @@ def get_current_user(
     )
     
     token = credentials.credentials
-    payload = verify_token(token)
-    if payload is None:
-        raise credentials_exception
-    
-    user_id: int = payload.get("sub")
+    cache_key = _token_cache_key(token)
+    with _token_cache_lock:
+        user_id = _token_cache.get(cache_key)
+
     if user_id is None:
-        raise credentials_exception
-    
+        payload = verify_token(token)
+        if payload is None:
+            raise credentials_exception
+
+        user_id = payload.get("sub")
+        if user_id is None:
+            raise credentials_exception
+
     user = db.query(User).filter(User.id == user_id).first()
     if user is None:
         raise credentials_exception
-    
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Inactive user"
         )
-    
+
+    with _token_cache_lock:
+        _token_cache[cache_key] = user.id
     return user
 
 
@@ -127,6 +181,62 @@ def require_seller(current_user: User = Depends(get_current_active_user)) -> Use
     return current_user
 
 
+async def require_seller_profile(
+    current_user: User = Depends(require_seller),
+    db: AsyncSession = Depends(get_async_db)
+) -> Seller:
+    """Require seller role and resolve the matching seller profile"""
+    result = await db.execute(select(Seller).where(Seller.user_id == current_user.id))
+    seller = result.scalar_one_or_none()
+    if not seller:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Seller profile not found"
+        )
+    return seller
+
+
+# user_id -> seller_id for the seller-facing endpoints. The mapping never
+# changes for an existing profile, so the short TTL only bounds how long a
+# deleted profile would keep resolving.
+_seller_id_cache = TTLCache(maxsize=5000, ttl=60)
+_seller_id_cache_lock = threading.Lock()
+
+# Construction-cached lookup for cache misses
+_SELLER_ID_BY_USER = lambda_stmt(
+    lambda: select(Seller.id).where(Seller.user_id == bindparam("user_id"))
+)
+
+
+async def resolve_seller_id(db: AsyncSession, user_id: int) -> Optional[int]:
+    """Look up the seller id for a user, served from a short-lived cache"""
+    with _seller_id_cache_lock:
+        seller_id = _seller_id_cache.get(user_id)
+    if seller_id is not None:
+        return seller_id
+
+    result = await db.execute(_SELLER_ID_BY_USER, {"user_id": user_id})
+    seller_id = result.scalar_one_or_none()
+    if seller_id is not None:
+        with _seller_id_cache_lock:
+            _seller_id_cache[user_id] = seller_id
+    return seller_id
+
+
+async def get_current_seller_id(
+    current_user: User = Depends(require_seller),
+    db: AsyncSession = Depends(get_async_db)
+) -> int:
+    """Require seller role and resolve the seller id for the current user"""
+    seller_id = await resolve_seller_id(db, current_user.id)
+    if seller_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Seller profile not found"
+        )
+    return seller_id
+
+
 def get_optional_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
     db: Session = Depends(get_db)
@@ -7,6 +7,10 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
 
+# Order states that count as revenue; analytics and admin reporting filter
+# on this tuple so the definition of "paid" lives in one place
+PAID_ORDER_STATUSES = ("paid", "processing", "shipped", "delivered")
+
 
 class Order(Base):
     __tablename__ = "orders"
@@ -0,0 +1,21 @@
+"""
+Cursor (keyset) pagination schemas
+"""
+
+from pydantic import BaseModel
+from typing import Generic, List, Optional, TypeVar
+from datetime import datetime
+
+ItemT = TypeVar("ItemT")
+
+
+class CursorPage(BaseModel, Generic[ItemT]):
+    """One page of results plus the cursor for fetching the next page.
+
+    Pass next_cursor/next_cursor_id back as the cursor/cursor_id query
+    parameters to continue; both are None on the last page.
+    """
+
+    items: List[ItemT]
+    next_cursor: Optional[datetime] = None
+    next_cursor_id: Optional[int] = None
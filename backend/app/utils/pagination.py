@@ -0,0 +1,34 @@
+"""
+Keyset pagination helpers for list endpoints
+"""
+
+from typing import Any, List, Optional
+from datetime import datetime
+from sqlalchemy import desc, tuple_
+
+
+def apply_cursor(query, model, cursor: Optional[datetime], cursor_id: Optional[int], limit: int):
+    """Apply the (created_at, id) keyset filter, ordering, and limit
+
+    Seeks past the cursor row instead of making the database read and
+    discard OFFSET rows on deep pages. The id tiebreaker keeps the order
+    stable when rows share a created_at timestamp.
+    """
+    if cursor is not None and cursor_id is not None:
+        query = query.where(tuple_(model.created_at, model.id) < (cursor, cursor_id))
+    return query.order_by(desc(model.created_at), desc(model.id)).limit(limit)
+
+
+def cursor_page(rows: List[Any], limit: int, items: Optional[List[Any]] = None) -> dict:
+    """Build a CursorPage payload from a fetched page
+
+    The last row supplies the next cursor when the page is full; pass
+    ``items`` when the response body serializes the rows differently
+    (e.g. column rows rendered as dicts).
+    """
+    full_page = len(rows) == limit
+    return {
+        "items": rows if items is None else items,
+        "next_cursor": rows[-1].created_at if full_page else None,
+        "next_cursor_id": rows[-1].id if full_page else None
+    }
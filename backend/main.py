@@ -15,7 +15,7 @@ import os
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, warm_async_pool
 from app.core.redis_client import redis_client
 from app.api.v1.api import api_router
 from app.core.exceptions import setup_exception_handlers
@@ -33,6 +33,10 @@ async def lifespan(app: FastAPI):
     
     # Create database tables
     Base.metadata.create_all(bind=engine)
+
+    # Prime the async connection pool so early requests skip the connect
+    # handshake
+    await warm_async_pool()
     
     # Test Redis connection (skip for now)
     # try:
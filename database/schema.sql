@@ -23,7 +23,8 @@ CREATE TABLE users (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     INDEX idx_email (email),
     INDEX idx_role (role),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_role_active_created (role, is_active, created_at DESC)
 );
 
 -- Sellers table
@@ -46,7 +47,8 @@ CREATE TABLE sellers (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
     INDEX idx_shop_name (shop_name),
-    INDEX idx_rating (rating)
+    INDEX idx_rating (rating),
+    INDEX idx_verified_active_created (is_verified, is_active, created_at DESC)
 );
 
 -- Categories table
@@ -64,7 +66,8 @@ CREATE TABLE categories (
     FOREIGN KEY (parent_id) REFERENCES categories(id) ON DELETE SET NULL,
     INDEX idx_slug (slug),
     INDEX idx_parent_id (parent_id),
-    INDEX idx_is_active (is_active)
+    INDEX idx_is_active (is_active),
+    FULLTEXT idx_name (name)
 );
 
 -- Products table
@@ -107,6 +110,7 @@ CREATE TABLE products (
     INDEX idx_status (status),
     INDEX idx_price (price),
     INDEX idx_created_at (created_at),
+    INDEX idx_status_created (status, created_at DESC),
     FULLTEXT idx_search (title, description, tags)
 );
 
@@ -193,7 +197,9 @@ CREATE TABLE orders (
     INDEX idx_buyer_id (buyer_id),
     INDEX idx_order_number (order_number),
     INDEX idx_status (status),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_status_created (status, created_at DESC),
+    INDEX idx_buyer_created (buyer_id, created_at DESC)
 );
 
 -- Order items
@@ -214,7 +220,9 @@ CREATE TABLE order_items (
     FOREIGN KEY (variation_id) REFERENCES product_variations(id) ON DELETE SET NULL,
     FOREIGN KEY (seller_id) REFERENCES sellers(id) ON DELETE RESTRICT,
     INDEX idx_order_id (order_id),
-    INDEX idx_seller_id (seller_id)
+    INDEX idx_seller_id (seller_id),
+    INDEX idx_product_id (product_id),
+    INDEX idx_seller_order (seller_id, order_id)
 );
 
 -- Payments table
@@ -233,8 +241,9 @@ CREATE TABLE payments (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
     INDEX idx_order_id (order_id),
-    INDEX idx_transaction_id (transaction_id),
-    INDEX idx_status (status)
+    UNIQUE INDEX idx_transaction_id (transaction_id),
+    INDEX idx_status (status),
+    INDEX idx_status_gateway_created (status, gateway, created_at DESC)
 );
 
 -- Seller payouts
@@ -256,7 +265,9 @@ CREATE TABLE seller_payouts (
     FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
     FOREIGN KEY (order_item_id) REFERENCES order_items(id) ON DELETE CASCADE,
     INDEX idx_seller_id (seller_id),
-    INDEX idx_status (status)
+    INDEX idx_status (status),
+    INDEX idx_status_created (status, created_at DESC),
+    INDEX idx_seller_created (seller_id, created_at DESC)
 );
 
 -- Messages (chat between buyers and sellers)
@@ -297,7 +308,8 @@ CREATE TABLE notifications (
     INDEX idx_user_id (user_id),
     INDEX idx_type (type),
     INDEX idx_is_read (is_read),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_is_read_created (is_read, created_at DESC)
 );
 
 -- Product reviews
@@ -375,7 +387,8 @@ CREATE TABLE analytics_events (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL,
     INDEX idx_user_id (user_id),
     INDEX idx_event_type (event_type),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX idx_event_type_created (event_type, created_at DESC)
 );
 
 -- System settings